@@ -8,31 +8,27 @@
 #   Option to create folder(s) in point B
 #   Option to rename copied files
 #   Option to delete files and folders at runtime
+# This is the window, the runs themselves are done by MandalaEngine.py
 
-import timeit
-import cProfile
-
-import re
 import os
 import sys
-import shutil
-import random
-import inspect
-import datetime
-import send2trash
+import array
+import tempfile
 import collections
-import soundfile
-import mutagen
-from mutagen.mp3 import MP3
-from distutils.util import strtobool
 from pathlib import Path
-from time import perf_counter, time
 from PySide2.QtWidgets import *
 from PySide2.QtGui import *
 from PySide2.QtCore import *
+from MandalaEngine import Mandala, RunOptions, MetadataCache, SIZE_UNITS, DURATION_UNITS, COPY_MODES, stringToList, cacheDirectory, renderRunLog, countSizeMatches
+
+def strtobool(value):
+    # Booleans come back from QSettings as 'true'/'false' strings. Replaces distutils' strtobool,
+    # importing distutils alone took longer than building the window
+    return value.lower() in ('y', 'yes', 't', 'true', 'on', '1')
 
 class WorkerSignals(QObject):
-    countSignal = Signal()
+    folderSignal = Signal(int)
+    countSignal = Signal(int)
     logSignal = Signal(object)
     timeSignal = Signal()
     finishedSignal = Signal()
@@ -41,6 +37,107 @@ class RunMandalaWorker(QRunnable):
     def run(self):
         window.runMandala()
 
+class LogModel(QAbstractListModel):
+    # Rows of the log view. Every line is written to a history file as it comes in and only a
+    # window of at most MAX_ROWS lines is held in memory. The window follows the newest lines
+    # and pages older ones back in from the file, PAGE_ROWS at a time, when asked to.
+    # The file keeps the byte offset of every PAGE_ROWS-th line, so reading a page is one seek
+    MAX_ROWS = 10000
+    PAGE_ROWS = 1000
+
+    def __init__(self):
+        super().__init__()
+        self.history = tempfile.TemporaryFile(dir=cacheDirectory(), prefix='log_')
+        self.pageOffsets = array.array('q')
+        self.total = 0
+        self.first = 0
+        self.rows = collections.deque()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.rows[index.row()]
+        return None
+
+    def isAtEnd(self):
+        return self.first + len(self.rows) == self.total
+
+    def appendLines(self, lines):
+        isAtEnd = self.isAtEnd()
+        self.history.seek(0, os.SEEK_END)
+        for line in lines:
+            if self.total % self.PAGE_ROWS == 0:
+                self.pageOffsets.append(self.history.tell())
+            self.history.write(line.encode('utf-8') + b'\n')
+            self.total += 1
+        # A window paged back into older lines stays put, fetchMore brings it forward again
+        if isAtEnd:
+            self.insertRowsAtEnd(lines)
+
+    def insertRowsAtEnd(self, lines):
+        if not lines:
+            return
+        lines = lines[-self.MAX_ROWS:]
+        self.removeRowsAtStart(len(self.rows) + len(lines) - self.MAX_ROWS)
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(lines) - 1)
+        self.rows.extend(lines)
+        self.endInsertRows()
+        self.first = self.total - len(self.rows)
+
+    def removeRowsAtStart(self, count):
+        count = min(count, len(self.rows))
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        for _ in range(count):
+            self.rows.popleft()
+        self.endRemoveRows()
+        self.first += count
+
+    def removeRowsAtEnd(self, count):
+        count = min(count, len(self.rows))
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), len(self.rows) - count, len(self.rows) - 1)
+        for _ in range(count):
+            self.rows.pop()
+        self.endRemoveRows()
+
+    def readLines(self, start, stop):
+        # Lines [start, stop) of the history file
+        page, skip = divmod(start, self.PAGE_ROWS)
+        self.history.seek(self.pageOffsets[page])
+        for _ in range(skip):
+            self.history.readline()
+        return [self.history.readline()[:-1].decode('utf-8') for _ in range(stop - start)]
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.isAtEnd()
+
+    def fetchMore(self, parent=QModelIndex()):
+        # Called by the view at the bottom of a window that was paged back
+        start = self.first + len(self.rows)
+        lines = self.readLines(start, min(start + self.PAGE_ROWS, self.total))
+        self.removeRowsAtStart(len(self.rows) + len(lines) - self.MAX_ROWS)
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(lines) - 1)
+        self.rows.extend(lines)
+        self.endInsertRows()
+
+    def fetchOlder(self):
+        # Pages the lines before the window back in, returns how many were added at the top
+        if self.first == 0:
+            return 0
+        start = max(0, self.first - self.PAGE_ROWS)
+        lines = self.readLines(start, self.first)
+        self.removeRowsAtEnd(len(self.rows) + len(lines) - self.MAX_ROWS)
+        self.beginInsertRows(QModelIndex(), 0, len(lines) - 1)
+        self.rows.extendleft(reversed(lines))
+        self.endInsertRows()
+        self.first = start
+        return len(lines)
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -49,7 +146,6 @@ class MainWindow(QWidget):
         self.openIcon = QIcon('icons/open.svg')
         self.noWrap = '<p style="white-space:pre">'
         self.wasEnabled = {}
-        self.listOfPaths = collections.defaultdict(bool)
 
         self.threadpool = QThreadPool()
         self.mandala = RunMandalaWorker()
@@ -64,11 +160,13 @@ class MainWindow(QWidget):
         
     def setupSignals(self):
         self.signals = WorkerSignals()
-        self.signals.countSignal.connect(lambda: self.progressBar.setValue(self.count))
+        self.signals.folderSignal.connect(lambda numberOfFiles: self.progressBar.setRange(0, numberOfFiles))
+        self.signals.countSignal.connect(self.progressBar.setValue)
         self.signals.timeSignal.connect(lambda: self.stallTimeProgressBar.setValue(self.stallTimeProgressBar.maximum()))
         self.signals.timeSignal.connect(lambda: self.stallTimeCounter.setText(f'{self.stallTimeProgressBar.value()/100} s'))
-        self.signals.logSignal.connect(lambda s: self.logBlock.append(s))
+        self.signals.logSignal.connect(self.appendLog)
         self.signals.finishedSignal.connect(lambda: self.timer.stop())
+        self.signals.finishedSignal.connect(self.finishRun)
 
     def makeSpin(self, lo, hi, enabled):
         name = QSpinBox()
@@ -223,6 +321,12 @@ class MainWindow(QWidget):
         self.makeFoldersUniqueCheck = QCheckBox('Make Unique')
         self.makeFoldersUniqueCheck.setChecked(True)
 
+        # Unique folders can be filled several at a time
+        parallelFoldersLabel = QLabel('At Once')
+        self.parallelFoldersCount = QSpinBox()
+        self.parallelFoldersCount.setRange(1, 64)
+        self.makeFoldersUniqueCheck.toggled.connect(self.parallelFoldersCount.setEnabled)
+
         labelRow = QHBoxLayout()
         labelRow.addWidget(self.folderButton)
         labelRow.addStretch()
@@ -235,11 +339,16 @@ class MainWindow(QWidget):
         row2.addWidget(foldersNameLabel)
         row2.addWidget(self.nameOfFoldersEntry)
 
+        row3 = QHBoxLayout()
+        row3.addWidget(self.makeFoldersUniqueCheck)
+        row3.addWidget(parallelFoldersLabel)
+        row3.addWidget(self.parallelFoldersCount)
+
         foldersL = QVBoxLayout()
         foldersL.addLayout(labelRow)        
         foldersL.addLayout(row1)
         foldersL.addLayout(row2)
-        foldersL.addWidget(self.makeFoldersUniqueCheck)
+        foldersL.addLayout(row3)
 
         self.foldersG = QGroupBox()
         self.foldersG.setLayout(foldersL)
@@ -298,6 +407,41 @@ class MainWindow(QWidget):
         self.trashG.setLayout(trashL)
 
         self.trashButton.toggled.connect(lambda: self.disableGroup(self.trashButton, self.trashG))
+
+    def setupSelectionUi(self): # self.selectionG
+        selectionLabel = self.createGroupLabel('Selection')
+
+        self.walkSelectRadio = QRadioButton('Walk')
+        self.walkSelectRadio.setChecked(True)
+        self.uniformSelectRadio = QRadioButton('Uniform')
+        self.biasSelectRadio = QRadioButton('Folder Bias')
+        self.streamSelectRadio = QRadioButton('Stream')
+
+        self.favorSizeCheck = QCheckBox('Favor Size')
+        self.favorSizeCheck.setEnabled(False)
+        self.favorRecentCheck = QCheckBox('Favor Recent')
+        self.favorRecentCheck.setEnabled(False)
+        self.skipDuplicatesCheck = QCheckBox('Skip Duplicates')
+
+        self.streamSelectRadio.toggled.connect(lambda: self.favorSizeCheck.setEnabled(self.streamSelectRadio.isChecked()))
+        self.streamSelectRadio.toggled.connect(lambda: self.favorRecentCheck.setEnabled(self.streamSelectRadio.isChecked()))
+
+        labelRow = QHBoxLayout()
+        labelRow.addWidget(selectionLabel)
+        labelRow.addStretch()
+
+        selectionL = QVBoxLayout()
+        selectionL.addLayout(labelRow)
+        selectionL.addWidget(self.walkSelectRadio)
+        selectionL.addWidget(self.uniformSelectRadio)
+        selectionL.addWidget(self.biasSelectRadio)
+        selectionL.addWidget(self.streamSelectRadio)
+        selectionL.addWidget(self.favorSizeCheck)
+        selectionL.addWidget(self.favorRecentCheck)
+        selectionL.addWidget(self.skipDuplicatesCheck)
+
+        self.selectionG = QGroupBox()
+        self.selectionG.setLayout(selectionL)
     
     def setupSetupTab(self): # self.setupTab
         self.setupFileCountUi()
@@ -306,8 +450,10 @@ class MainWindow(QWidget):
         self.setupCreateFoldersUi()
         self.setupFileNameUi()
         self.setupTrashUi()
+        self.setupSelectionUi()
 
         outputRow = QHBoxLayout()
+        outputRow.addWidget(self.selectionG)
         outputRow.addWidget(self.foldersG)
         outputRow.addWidget(self.fileNameG)
         outputRow.addWidget(self.trashG)
@@ -328,16 +474,36 @@ class MainWindow(QWidget):
         self.incKeysEdit = QLineEdit()
         self.excKeysEdit = QLineEdit()
 
+        self.incKeysFileEdit = QLineEdit()
+        self.incKeysFileEdit.setPlaceholderText('Keyword file')
+        self.excKeysFileEdit = QLineEdit()
+        self.excKeysFileEdit.setPlaceholderText('Keyword file')
+
+        self.browseIncKeysButton = QPushButton()
+        self.browseIncKeysButton.setIcon(self.browseIcon)
+        self.browseExcKeysButton = QPushButton()
+        self.browseExcKeysButton.setIcon(self.browseIcon)
+
         self.toSwitchKeys = QPushButton('Switch')
 
-        incKeysL = QHBoxLayout()
+        incKeysFileRow = QHBoxLayout()
+        incKeysFileRow.addWidget(self.incKeysFileEdit)
+        incKeysFileRow.addWidget(self.browseIncKeysButton)
+
+        incKeysL = QVBoxLayout()
         incKeysL.addWidget(self.incKeysEdit)
+        incKeysL.addLayout(incKeysFileRow)
         self.incKeysG = QGroupBox('Include')
         self.incKeysG.setLayout(incKeysL)
         self.incKeysG.setCheckable(True)
 
-        excKeysL = QHBoxLayout()
+        excKeysFileRow = QHBoxLayout()
+        excKeysFileRow.addWidget(self.excKeysFileEdit)
+        excKeysFileRow.addWidget(self.browseExcKeysButton)
+
+        excKeysL = QVBoxLayout()
         excKeysL.addWidget(self.excKeysEdit)
+        excKeysL.addLayout(excKeysFileRow)
         self.excKeysG = QGroupBox('Exclude')
         self.excKeysG.setLayout(excKeysL)
         self.excKeysG.setCheckable(True)
@@ -351,6 +517,8 @@ class MainWindow(QWidget):
         self.keywordsG.setLayout(keywordsL)
 
         self.toSwitchKeys.clicked.connect(self.switchKeys)
+        self.browseIncKeysButton.clicked.connect(lambda: self.browseKeywordFile(self.incKeysFileEdit))
+        self.browseExcKeysButton.clicked.connect(lambda: self.browseKeywordFile(self.excKeysFileEdit))
         self.incKeysG.toggled.connect(lambda: self.disableGroup(self.incKeysG))
         self.excKeysG.toggled.connect(lambda: self.disableGroup(self.excKeysG))
 
@@ -414,10 +582,14 @@ class MainWindow(QWidget):
         row2.addWidget(self.sizeHi)
         row2.addWidget(self.sizeType)
 
+        # Filled in from the root's file catalog once a run has built one
+        self.sizeMatchLabel = QLabel('')
+
         fileSizeL = QVBoxLayout()
         fileSizeL.addLayout(labelRow)
         fileSizeL.addLayout(row1)
         fileSizeL.addLayout(row2)
+        fileSizeL.addWidget(self.sizeMatchLabel)
         
         self.sizeG = QGroupBox()
         self.sizeG.setLayout(fileSizeL)
@@ -426,6 +598,12 @@ class MainWindow(QWidget):
         self.sizeHi.editingFinished.connect(self.switchSize)
         self.sizeButton.toggled.connect(lambda: self.disableGroup(self.sizeButton, self.sizeG))
 
+        self.sizeLo.valueChanged.connect(self.updateSizeMatches)
+        self.sizeHi.valueChanged.connect(self.updateSizeMatches)
+        self.sizeType.currentIndexChanged.connect(self.updateSizeMatches)
+        self.sizeButton.toggled.connect(self.updateSizeMatches)
+        self.rootCombo.currentTextChanged.connect(self.updateSizeMatches)
+
     def setupDurationUi(self): # self.durationG
         self.lengthButton = self.createGroupButton('File Length')
 
@@ -549,7 +727,6 @@ class MainWindow(QWidget):
         self.stopButton = QPushButton('Stop')
         self.stopButton.clicked.connect(self.stopMandalaPush)
         self.stopButton.setVisible(False)
-        self.stopTracker = False
 
         # STALL TIMER BAR DISPLAY
         self.stallTimeSpinBox = QDoubleSpinBox()
@@ -570,10 +747,15 @@ class MainWindow(QWidget):
 
         self.logLabel = QLabel('Log')
 
-        self.logBlock = QTextBrowser()
+        # Only the visible rows are drawn, the model holds a bounded window of the log
+        self.logModel = LogModel()
+        self.logBlock = QListView()
+        self.logBlock.setModel(self.logModel)
+        self.logBlock.setUniformItemSizes(True)
+        self.logBlock.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.logBlock.setMinimumHeight(175)
         self.logBlock.setMaximumHeight(175)
-        self.logBlock.setLineWrapMode(QTextEdit.NoWrap)
+        self.logBlock.verticalScrollBar().valueChanged.connect(self.pageOlderLog)
 
         self.timer = QTimer()
         self.timer.setSingleShot(False)
@@ -622,6 +804,24 @@ class MainWindow(QWidget):
         self.resetButton = QPushButton('Reset to Default')
         self.resetButton.clicked.connect(lambda: self.guiRestore(self.settings))
 
+        self.compactCacheButton = QPushButton('Compact Cache')
+        self.compactCacheButton.clicked.connect(self.compactMetadataCache)
+
+        self.viewLogButton = QPushButton('View Log')
+        self.viewLogButton.clicked.connect(self.viewRunLog)
+
+        self.copyThreadsLabel = QLabel('Copies')
+        self.copyThreadsSpinBox = self.makeSpin(1, 64, True)
+        self.copyThreadsSpinBox.setValue(4)
+
+        copyThreadsRow = QHBoxLayout()
+        copyThreadsRow.addWidget(self.copyThreadsLabel)
+        copyThreadsRow.addWidget(self.copyThreadsSpinBox)
+
+        # Hardlinks and symlinks only make sense when the destination is on the source's volume
+        self.copyModeCombo = QComboBox()
+        self.copyModeCombo.addItems(COPY_MODES)
+
         self.sideBar = QVBoxLayout()
         self.sideBar.addSpacing(20)
         self.sideBar.addWidget(self.openButton)
@@ -630,7 +830,11 @@ class MainWindow(QWidget):
         self.sideBar.addWidget(self.openDest)
         self.sideBar.addWidget(self.defaultButton)
         self.sideBar.addWidget(self.resetButton)
+        self.sideBar.addWidget(self.compactCacheButton)
+        self.sideBar.addWidget(self.viewLogButton)
         self.sideBar.addStretch()
+        self.sideBar.addLayout(copyThreadsRow)
+        self.sideBar.addWidget(self.copyModeCombo)
         self.sideBar.addWidget(self.showHelp)
         self.sideBar.addWidget(self.showInvalid)
     
@@ -701,10 +905,6 @@ class MainWindow(QWidget):
 
     ### ROOT AND DESTINATION METHODS ###
 
-    def resetPathToStart(self):
-        os.chdir(self.root)
-        return Path.cwd()
-
     def changeRoot(self):
         self.root = Path(self.rootCombo.currentText())
     
@@ -744,414 +944,116 @@ class MainWindow(QWidget):
 
     ### RUN METHODS ###
 
-    def assignGlobalVariables(self):
-        # Global collections
-        self.touchedFiles = collections.defaultdict(bool)  # type: ignore
-        self.touchedFolders = collections.defaultdict(bool)  # type: ignore
-        self.touchedByWeight = collections.defaultdict(bool) # type: ignore
-        self.weighted = collections.defaultdict(int)  # type: ignore
-
-        # File Count Variables
-        self.isRandFiles = self.randomFileG.isChecked()
-        self.numberOfFiles = self.numFilesCount.value()
-
-        # Root and Destination
-        self.root = Path(self.rootCombo.currentText())
-        self.dest = Path(self.destCombo.currentText())
-
-        # Keyword Variables
-        if self.incKeysG.isChecked():
-            self.keywords = self.stringToList(self.incKeysEdit.text())
+    def runOptions(self):
+        # Options of the next run as set in the Setup and Customize tabs
+        if self.walkSelectRadio.isChecked():
+            selection = 'walk'
+        elif self.uniformSelectRadio.isChecked():
+            selection = 'uniform'
+        elif self.biasSelectRadio.isChecked():
+            selection = 'bias'
         else:
-            self.keywords = []
-        
-        if self.excKeysG.isChecked():
-            self.notKeywords = self.stringToList(self.excKeysEdit.text())
-        else:
-            self.notKeywords = []
+            selection = 'stream'
+
+        fileNames = 'keep'
+        if self.fileNameButton.isChecked() and self.indexFilesRadio.isChecked():
+            fileNames = 'index'
+        elif self.fileNameButton.isChecked() and self.renameFilesRadio.isChecked():
+            fileNames = 'rename'
+
+        isIncludeKeys = self.incKeysG.isChecked()
+        isExcludeKeys = self.excKeysG.isChecked()
+        isTrash = self.trashButton.isChecked()
+        return RunOptions(self.rootCombo.currentText(), self.destCombo.currentText(),
+            numberOfFiles=self.numFilesCount.value(),
+            randomFiles=(self.numFilesLo.value(), self.numFilesHi.value()) if self.randomFileG.isChecked() else None,
+            keywords=stringToList(self.incKeysEdit.text()) if isIncludeKeys else [],
+            notKeywords=stringToList(self.excKeysEdit.text()) if isExcludeKeys else [],
+            keywordFile=self.incKeysFileEdit.text() if isIncludeKeys else '',
+            notKeywordFile=self.excKeysFileEdit.text() if isExcludeKeys else '',
+            extensions=stringToList(self.incExtsEdit.text()) if self.incExtsG.isChecked() else [],
+            notExtensions=stringToList(self.excExtsEdit.text()) if self.excExtsG.isChecked() else [],
+            sizeRange=self.convertToBytes() if self.sizeButton.isChecked() else None,
+            durationRange=self.convertToSeconds() if self.lengthButton.isChecked() else None,
+            topWeight=self.topWeightSpinBox.value() if self.weightButton.isChecked() else 0,
+            bottomWeight=self.bottomWeightSpinBox.value() if self.weightButton.isChecked() else 0,
+            selection=selection,
+            favorSize=self.favorSizeCheck.isChecked(),
+            favorRecent=self.favorRecentCheck.isChecked(),
+            skipDuplicates=self.skipDuplicatesCheck.isChecked(),
+            createFolders=self.folderButton.isChecked(),
+            numberOfFolders=self.numFoldersCount.value(),
+            nameOfFolders=self.nameOfFoldersEntry.text(),
+            makeFoldersUnique=self.makeFoldersUniqueCheck.isChecked(),
+            parallelFolders=self.parallelFoldersCount.value(),
+            fileNames=fileNames,
+            renameName=self.renameNameEntry.text(),
+            trashEmptyFolders=isTrash and self.isTrashEmpty.isChecked(),
+            trashSourceFiles=isTrash and self.isTrashSource.isChecked(),
+            trashInvalidFiles=isTrash and self.isTrashInvalid.isChecked(),
+            copyThreads=self.copyThreadsSpinBox.value(),
+            copyMode=self.copyModeCombo.currentText(),
+            stallLimit=self.stallLimit,
+            showInvalid=self.showInvalid.isChecked())
 
-        # Extension Variables
-        if self.incExtsG.isChecked():
-            self.extensions = self.stringToList(self.incExtsEdit.text())
-        else:
-            self.extensions = []
-        
-        if self.excExtsG.isChecked():
-            self.notExtensions = self.stringToList(self.excExtsEdit.text())
-        else:
-            self.notExtensions = []
-
-        # File Size Variables
-        self.isRemoveSizeLimit = not self.sizeButton.isChecked()
-        if not self.isRemoveSizeLimit:
-            self.minSize = self.sizeLo.value()
-            self.maxSize = self.sizeHi.value()
-            self.convertToBytes()
-
-        # File Length Variables
-        self.isRemoveLengthLimit = not self.lengthButton.isChecked()
-        if  not self.isRemoveLengthLimit:
-            self.maxDuration = self.durationHi.value()
-            self.minDuration = self.durationLo.value()
-            self.convertToSeconds()
-
-        # Weight Variables
-        if self.weightButton.isChecked():
-            self.topWeightValue = self.topWeightSpinBox.value()
-            self.bottomWeightValue = self.bottomWeightSpinBox.value()
-        else:
-            self.topWeightValue = 0
-            self.bottomWeightValue = 0
-        
-
-        # Folder Variables
-        self.makeFoldersUnique = self.makeFoldersUniqueCheck.isChecked()
-        self.nameOfFolders = self.nameOfFoldersEntry.text()
-        self.isCreateFolders = self.folderButton.isChecked()
+    def runMandala(self):
+        # Runs on the thread pool, the engine reports back through self.signals
+        self.mandalaRun.run()
 
-        # Folder Count
-        if self.isCreateFolders:
-            self.numFolders = self.numFoldersCount.value()
-        else:
-            self.numFolders = 1
-        
-        # Filename Variables
-        if self.fileNameButton.isChecked():
-            self.indexFiles = self.indexFilesRadio.isChecked()
-            self.renameFiles = self.renameFilesRadio.isChecked()
-            self.renameName = self.renameNameEntry.text()
-        else:
-            self.indexFiles = False
-            self.renameFiles = False
-            self.renameName = ''
-        
-        # Trash Variables
-        if self.trashButton.isChecked():
-            self.trashEmptyFolders = self.isTrashEmpty.isChecked()
-            self.trashSourceFiles = self.isTrashSource.isChecked()
-            self.trashInvalidFiles = self.isTrashInvalid.isChecked()
-        else:
-            self.trashEmptyFolders = False
-            self.trashSourceFiles = False
-            self.trashInvalidFiles = False
-
-        self.startAbsolute = os.path.abspath(self.root)
-        self.rename2 = ' '
-        self.isAppendLog = False
-        self.count = 0
-        self.bytesInCurrentFolder = 0
-        self.startFolderTime = perf_counter() 
-        self.startStallTime = perf_counter()
+    def compactMetadataCache(self):
+        cache = MetadataCache()
+        cache.vacuum()
+        cache.close()
 
-    def runMandala(self):
-        self.assignGlobalVariables()
-
-        for folder in range(self.numFolders):
-            if self.stopTracker:
-                self.stopMandala()
-                return
-
-            # If you don't want unique folders, clear the touched dictionaries and restart
-            if self.makeFoldersUnique:
-                self.touchedFolders[self.startAbsolute] = False
-                for key in self.touchedByWeight.keys():
-                    self.touchedFolders[key] = False
-                    self.touchedFiles[key] = False  
-            else:
-                self.touchedFiles = collections.defaultdict(bool)  # type: ignore
-                self.touchedFolders = collections.defaultdict(bool)  # type: ignore
-            
-            self.dest = Path(self.destCombo.currentText())
-            
-            topWeightMark = ''
-            self.weighted = collections.defaultdict(int)
-            self.touchedByWeight = collections.defaultdict(bool) # type: ignore
+    ### LOG METHODS ###
 
-            self.bytesInCurrentFolder = 0
-            self.count = 0
-            self.dest = self.createFolders(self.dest)
-            
-            dummyFile = self.log.name + '.tmp'
-            self.dummyLog = open(dummyFile, 'a', encoding='utf-8')
-
-            self.startFolderTime = perf_counter() 
-            self.startStallTime = perf_counter()
-            mainPath = self.resetPathToStart() 
-
-            # File Count
-            if self.isRandFiles:
-                self.numberOfFiles = random.randint(self.numFilesLo.value(), self.numFilesHi.value())
-            self.progressBar.setRange(0, self.numberOfFiles)
-
-            for currFile in range(self.numberOfFiles):
-                if self.stopTracker:
-                    self.stopMandala()
-                    return
-                if self.touchedFolders[self.startAbsolute] and self.isTimedOut(self.startStallTime):
-                    break
-
-                while not self.touchedFolders[self.startAbsolute] and not self.isTimedOut(self.startStallTime):
-                    if self.stopTracker:
-                        self.stopMandala()
-                        return
-                    mainPathAbsolute = os.path.abspath(mainPath)
-                    # Try to get main path
-                    try:
-                        if not self.listOfPaths[mainPathAbsolute]:
-                            self.listOfPaths[mainPathAbsolute] = os.listdir(mainPath)
-                    except PermissionError: 
-                        self.touchedFolders[mainPathAbsolute] = True 
-                        mainPath = self.resetPathToStart()
-                        continue
-                        
-                    # If folder is empty
-                    if (len(self.listOfPaths[mainPathAbsolute]) == 0): 
-                        self.touchedFolders[mainPathAbsolute] = True
-                        if self.trashEmptyFolders: send2trash.send2trash(str(mainPathAbsolute))
-                        mainPath = self.resetPathToStart()
-                    # If the folder is not empty
-                    else: 
-                        # Chooses random path and stores absolute path
-                        randomPath = Path(random.choice(self.listOfPaths[mainPathAbsolute]))
-                        randomPathAbsolute = os.path.abspath(randomPath)
-                        # If touched, try again:
-                        if self.touchedFiles[randomPathAbsolute] or self.touchedFolders[randomPathAbsolute]:
-                            self.touchFolderIfAllFilesTouched(self.listOfPaths[mainPathAbsolute], mainPathAbsolute)
-                            mainPath = self.resetPathToStart()          
-                        # If random path is folder
-                        elif randomPath.is_dir():
-                            try:
-                                os.chdir(randomPath)
-                                mainPath = Path.cwd()
-                                if self.topWeightValue > 0 and Path(randomPathAbsolute).parent == self.root:
-                                    topWeightMark = randomPathAbsolute
-
-                            except PermissionError:
-                                self.touchedFolders[randomPathAbsolute] = True 
-                                mainPath = self.resetPathToStart()
-
-                        # If random path is file:
-                        elif randomPath.is_file():
-                            # Touch the file and get size
-                            self.touchedFiles[randomPathAbsolute] = True
-                            randomPathSize = os.path.getsize(randomPath)
-                            randomPathRelative = os.path.relpath(randomPath, self.root)
-                            # If file is valid
-                            if self.isValidFile(randomPath, randomPathSize) and self.copyFilesToTarget(currFile, randomPath, self.dest, randomPathSize):
-                                if not self.isAppendLog:
-                                    self.log.write(f'{currFile+1}: {randomPathRelative}\n')
-                                    self.signals.logSignal.emit(f'{currFile+1}: {randomPathRelative}')
-                                else:
-                                    self.dummyLog.write(f'{currFile+1}: {randomPathRelative}\n')
-                                    self.signals.logSignal.emit(f'{currFile+1}: {randomPathRelative}')
-                                    
-                                self.bytesInCurrentFolder += randomPathSize
-                                self.count += 1
-                                self.signals.countSignal.emit()
-                                self.startStallTime = perf_counter()
-                                self.signals.timeSignal.emit()
-
-                                if self.trashSourceFiles: 
-                                    send2trash.send2trash(str(randomPathAbsolute))
-                                
-                                if self.topWeightValue > 0:
-                                    self.weighted[topWeightMark] += 1
-                                    if self.weighted[topWeightMark] == self.topWeightValue:
-                                        self.touchedFolders[topWeightMark] = True
-                                        self.touchedByWeight[topWeightMark] = True
-
-                                if self.bottomWeightValue > 0: 
-                                    self.weighted[mainPathAbsolute] += 1
-                                    if self.weighted[mainPathAbsolute] == self.bottomWeightValue:
-                                        self.touchedFolders[mainPathAbsolute] = True
-                                        self.touchedByWeight[mainPathAbsolute] = True
-                                
-                                #topWeightMark = ' '
-                                mainPath = self.resetPathToStart()                               
-                                break
-                            # If file is invalid
-                            else:
-                                if self.showInvalid.isChecked() and self.count < 100:
-                                    self.signals.logSignal.emit(f'**: {randomPathRelative}')
-                                elif self.showInvalid.isChecked() and self.count >= 100:
-                                    self.signals.logSignal.emit(f'***: {randomPathRelative}')
-                                elif self.showInvalid.isChecked() and self.count >= 1000:
-                                    self.signals.logSignal.emit(f'****: {randomPathRelative}')
-                                
-                                if self.trashInvalidFiles: 
-                                    send2trash.send2trash(str(randomPathAbsolute))
-                                
-                                mainPath = self.resetPathToStart()      
-
-            ##################################################   END OF FOLDER  ##################################################           
-            # Create and write log at the end of folder
-            self.dummyLog.close()
-            self.log.close()
-            self.signals.logSignal.emit(self.writeStatusLog())
-            # Terminates the program if no files were collected
-            if self.count == 0 and self.isCreateFolders: 
-                shutil.rmtree(self.dest)
-                break
-            elif self.count == 0 and not self.isCreateFolders and not self.isAppendLog: 
-                os.remove(self.log.name)
-
-        self.stopMandala()
-    
-    def isValidFile(self, source, size):
-        # If anything remains False the file is invalid
-        isExtension = False
-        isKeyword = False
-        isWithinSizeRange = False
-        isWithinDuration = False
-
-        # If no limit, all valid, else checks valid size range. Returns immediately if neither
-        if self.isRemoveSizeLimit:
-            isWithinSizeRange = True
-        elif self.minSize <= size <= self.maxSize:
-            isWithinSizeRange = True
-        else:
-            return False
-
-        # If a blacklist extension or keyword is found, immediately return invalid
-        for notExtension in self.notExtensions:
-            if re.compile(rf'\.{notExtension}$', re.I).search(source.suffix) != None:
-                return False
-        for notKeyword in self.notKeywords:
-            if re.compile(rf'(.*){notKeyword}(.*)', re.I).search(source.stem) != None:
-                return False
-
-        # If no extension or keyword, all valid.
-        # If whitelist item found, immediately breaks
-        if not self.extensions:
-            isExtension = True
-        else:
-            for extension in self.extensions:
-                if re.compile(rf'\.{extension}$', re.I).search(source.suffix) != None:
-                    isExtension = True
-                    break
-        if not self.keywords:
-            isKeyword = True
-        else:    
-            for notKeyword in self.keywords:
-                if re.compile(rf'(.*){notKeyword}(.*)', re.I).search(source.stem) != None:
-                    isKeyword = True
-                    break
-        
-        # If a duration can be get it will be checked, otherwise skips
-        if self.isRemoveLengthLimit:
-            isWithinDuration = True
-        else:
+    def appendLog(self, lines):
+        # Status blocks come in as one multi-line entry, the view shows one row per line
+        scrollBar = self.logBlock.verticalScrollBar()
+        isAtBottom = scrollBar.value() == scrollBar.maximum()
+        self.logModel.appendLines([row for line in lines for row in line.split('\n')])
+        if isAtBottom and self.logModel.isAtEnd():
+            self.logBlock.scrollToBottom()
+
+    def viewRunLog(self):
+        # Run logs are JSON Lines, the statuses and file lists are rendered when one is opened
+        logFile, _ = QFileDialog.getOpenFileName(self, 'View Run Log', str(self.dest), 'Run Log (*.jsonl)')
+        if logFile:
             try:
-                sound = soundfile.SoundFile(source)
-                duration = len(sound) / sound.samplerate
-                if self.minDuration <= duration <= self.maxDuration:
-                    isWithinDuration = True
-                else:
-                    return False
-            except RuntimeError:
-                if source.suffix == '.mp3':
-                    try:
-                        duration = MP3(source).info.length
-                        if self.minDuration <= duration <= self.maxDuration:
-                            isWithinDuration = True
-                        else:
-                            return False
-                    except:
-                        isWithinDuration = True
-                else:
-                    isWithinDuration = True
-            except:
-                isWithinDuration = True
-        
-        # Checks that everything is True
-        if isExtension and isKeyword and isWithinSizeRange and isWithinDuration:
-            return True
-        else:
-            return False
+                self.appendLog([renderRunLog(logFile)])
+            except OSError:
+                self.appendLog([f'Run log could not be read: {logFile}'])
+
+    def pageOlderLog(self, value):
+        # Scrolling to the top of the window reads the page before it from the history file
+        if value != self.logBlock.verticalScrollBar().minimum():
+            return
+        added = self.logModel.fetchOlder()
+        if added:
+            self.logBlock.scrollTo(self.logModel.index(added), QAbstractItemView.PositionAtTop)
 
-    def copyFilesToTarget(self, fileNum, source, dest, sourceSize):
-        sourceAbsolute = os.path.abspath(source)
-        sourceName = source.name
-        try:
-            if self.indexFiles:
-                shutil.copy(sourceAbsolute, dest / f'{fileNum+1}.{sourceName}')
-            elif self.renameFiles:
-                if not (dest / f'{self.renameName} {fileNum+1}{source.suffix}').exists():
-                    shutil.copy(sourceAbsolute, dest / f'{self.renameName} {fileNum+1}{source.suffix}')
-                    self.rename2 = f'{self.renameName} {fileNum+1}'
-                else:
-                    x = 1
-                    while (dest / f'{self.renameName} {fileNum+x}{source.suffix}').exists():
-                        x += 1
-                    shutil.copy(sourceAbsolute, dest / f'{self.renameName} {fileNum+x}{source.suffix}')
-                    self.rename2 = f'{self.renameName} {fileNum+x}'
-            else:
-                x = 2
-                while (dest / f'{sourceName}').exists():
-                    if sourceSize == os.path.getsize(dest / f'{sourceName}'):
-                        return False
-                    sourceName = source.stem + f' ({x})' + source.suffix
-                    x += 1
-                shutil.copy(sourceAbsolute, dest / f'{sourceName}')
-            return True
-        except PermissionError:
-            return False
-    
-    def createFolders(self, target):
-        if not self.isCreateFolders:
-            if Path(target/f'!{target.name}_log.txt').exists():
-                self.isAppendLog = True
-            else:
-                self.isAppendLog = False
-            self.log = open(target/f'!{target.name}_log.txt', 'a', encoding='utf-8')
-        else:
-            try:
-                Path(f'{target}/{self.nameOfFolders}').mkdir()
-                target = target/f'{self.nameOfFolders}'
-                self.log = open(target/f'!{self.nameOfFolders}_log.txt', 'a', encoding='utf-8')
-            except FileExistsError:
-                for x in range(len(os.listdir(target))):
-                    try:
-                        Path(f'{target}/{self.nameOfFolders} {x+2}').mkdir()
-                        target = target/f'{self.nameOfFolders} {x+2}'
-                        self.log = open(target/f'!{self.nameOfFolders} {x+2}_log.txt', 'a', encoding='utf-8')
-                        break
-                    except FileExistsError: 
-                        continue
-        return target
-
-    def touchFolderIfAllFilesTouched(self, listOfPath, absolutePath):
-        for fileFolder in listOfPath:
-            path = os.path.abspath(fileFolder)
-            if self.touchedFiles[path] or self.touchedFolders[path]:
-                pass
-            else:
-                return
-        self.touchedFolders[absolutePath] = True
-    
     ### PROGRESS, TIMER METHODS ###
 
     def changeStallTimeSpinBox(self):
         self.stallLimit = self.stallTimeSpinBox.value()
         self.stallTimeCounter.setText(f'{self.stallLimit}0 s')
 
-    def isTimedOut(self, startStallTime):
-        endStallTime = perf_counter()
-        if endStallTime - startStallTime > self.stallLimit: 
-            return True
-        else: 
-            return False
-
     def updateTimer(self):
         self.stallTimeProgressBar.setValue(self.stallTimeProgressBar.value() - 1)
         self.stallTimeCounter.setText(f'{self.stallTimeProgressBar.value()/100} s')
 
     def runMandalaPush(self):
-        for name, obj in inspect.getmembers(self):
+        try:
+            options = self.runOptions()
+        except ValueError as error:
+            self.appendLog([str(error)])
+            return
+
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QWidget) and not (name in ['stopButton', 'logBlock']):
                 self.wasEnabled[name] = obj.isEnabled()
 
-        for name, obj in inspect.getmembers(self):
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QWidget) and not (name in ['stopButton', 'logBlock']):
                 obj.setEnabled(False)
 
@@ -1166,116 +1068,25 @@ class MainWindow(QWidget):
         self.stopButton.setVisible(True)
         self.stallTimeCounter.setVisible(True)
         self.stallTimeSpinBox.setVisible(False)
-        self.stopTracker = False
 
+        self.mandalaRun = Mandala(options, self.signals)
         self.threadpool.globalInstance().start(self.mandala)
 
     def stopMandalaPush(self):
-        self.stopTracker = True
+        self.mandalaRun.stop()
     
-    def stopMandala(self):
-        self.signals.finishedSignal.emit()
-
-        self.dummyLog.close()
-        self.log.close()
-        self.signals.logSignal.emit(self.writeStatusLog())
-        
+    def finishRun(self):
         self.runButton.setVisible(True)
         self.stopButton.setVisible(False)
         self.stallTimeCounter.setVisible(False)
         self.stallTimeSpinBox.setVisible(True)
         self.stallTimeCounter.setText(f'{self.stallLimit}0 s')
-        self.dest = Path(self.destCombo.currentText())
-        for name, obj in inspect.getmembers(self):
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QWidget) and not (name in ['stopButton', 'logBlock']):
                 obj.setEnabled(self.wasEnabled[name])
-        
+        self.updateSizeMatches()
 
 
-    ### LOG METHODS ###
-
-    def writeStatusLog(self):
-        endFolderTime = perf_counter()
-        endStallTime = perf_counter()
-        currentDate = datetime.datetime.now().strftime('%B %d, %Y')
-        currentTime = datetime.datetime.now().strftime('%I:%M:%S%p')
-        status = ''
-        timeOut = self.isTimedOut(self.startStallTime)
-
-        if self.count == self.numberOfFiles:
-            status = f'SUCCESS: {self.count}/{self.numberOfFiles} files copied'
-        elif timeOut and self.count == 0 and self.isCreateFolders: 
-            status = f'NO FILES FOUND: timed out | folder deleted'
-        elif self.touchedFolders[self.startAbsolute] and self.count == 0 and self.isCreateFolders: 
-            status = f'NO FILES FOUND: all files searched | folder deleted'
-        elif self.touchedFolders[self.startAbsolute]: 
-            status = f'ALL FILES SEARCHED: {self.count}/{self.numberOfFiles} files copied'
-        elif timeOut: 
-            status = f'TIMED OUT: {self.count}/{self.numberOfFiles} files copied'
-        elif self.stopTracker:
-            status = f'STOPPED: {self.count}/{self.numberOfFiles} files copied'       
-        statusLog = f'''------------------------------------------------------------------------
-{status}
-------------------------------------------------------------------------
-Date:\t\t{currentDate}
-Time:\t\t{currentTime}
-Start:\t\t{self.root} 
-Destination:\t{self.dest}
-Extensions:\t{self.printExtensions()}
-Keywords:\t{self.printKeywords()}
-Total size:\t{self.byteToMbGb(self.bytesInCurrentFolder)}
-Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s      
-------------------------------------------------------------------------'''
-        statusLogApp = f'''------------------------------------------------------------------------
-{status}
-------------------------------------------------------------------------
-Date:\t{currentDate}
-Time:\t{currentTime}
-Start:\t{self.root} 
-Destination:\t{self.dest}
-Extensions:\t{self.printExtensions()}
-Keywords:\t{self.printKeywords()}
-Total size:\t{self.byteToMbGb(self.bytesInCurrentFolder)}
-Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s      
-------------------------------------------------------------------------'''
-        self.prependStatusToLog(statusLog)
-        return statusLogApp
-
-    def prependStatusToLog(self, status):
-        dummyFile = self.log.name + '.tmp'
-        # IF ITS A NEW LOG, APPEND STATUS
-        if not self.isAppendLog:
-            with open(self.log.name, 'r', encoding='utf-8') as read_obj, open(dummyFile, 'w', encoding='utf-8') as write_obj:
-                write_obj.write(status + '\n')
-                for status in read_obj:
-                    write_obj.write(status)
-            os.remove(self.log.name)
-            os.rename(dummyFile, self.log.name)
-        else:
-            with open(dummyFile, 'r', encoding='utf-8') as read_obj, open(self.log.name, 'a', encoding='utf-8') as write_obj:
-                write_obj.write(status + '\n')
-                for status in read_obj:
-                    write_obj.write(status)
-            os.remove(dummyFile)
-
-    def printKeywords(self):
-        KeywordsStatus = ''
-        for keyword in self.keywords:
-            if keyword != self.keywords[-1]:
-                KeywordsStatus += '"' + keyword + '"' + ', '
-            else:
-                KeywordsStatus += '"' + keyword + '"'
-                return KeywordsStatus
-
-    def printExtensions(self):
-        ExtensionsStatus = ''
-        for extension in self.extensions:
-            if extension != self.extensions[-1]: 
-                ExtensionsStatus += '.' + extension + ', '
-            else:
-                ExtensionsStatus += '.' + extension
-                return ExtensionsStatus
-
     ### FILE COUNT METHODS ###
 
     def switchFileCount(self):
@@ -1313,33 +1124,18 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
             self.sizeLo.setValue(hi)
             self.sizeHi.setValue(lo)
 
+    def updateSizeMatches(self):
+        # The unit combo is emptied while settings are restored
+        if self.sizeType.currentText() not in SIZE_UNITS:
+            return
+        lo, hi = self.convertToBytes()
+        count = countSizeMatches(self.rootCombo.currentText(), (min(lo, hi), max(lo, hi)) if self.sizeButton.isChecked() else None)
+        self.sizeMatchLabel.setText('' if count is None else f'{count} files match')
+
     def convertToBytes(self):
-        byteInKilobyte = 1024
-        byteInMegabyte = 1048576
-        byteInGigabyte = 1073741824
-        currentText = self.sizeType.currentText()
-
-        if currentText == 'B':
-            self.minSize = round(self.sizeLo.value(), 2)
-            self.maxSize = round(self.sizeHi.value(), 2)
-        elif currentText == 'KB':
-            self.minSize = round(self.sizeLo.value() * byteInKilobyte, 2)
-            self.maxSize = round(self.sizeHi.value() * byteInKilobyte, 2)
-        elif currentText == 'MB':
-            self.minSize = round(self.sizeLo.value() * byteInMegabyte, 2)
-            self.maxSize = round(self.sizeHi.value() * byteInMegabyte, 2)  
-        elif currentText == 'GB':
-            self.minSize = round(self.sizeLo.value() * byteInGigabyte, 2)
-            self.maxSize = round(self.sizeHi.value() * byteInGigabyte, 2)
-
-    def byteToMbGb(self, bytesInCurrentFolder):
-        BYTE_TO_MEGABYTE = 9.53674316406 * 10**(-7)
-        BYTE_TO_GIGABYTE = 9.31322575 * 10**(-10)
-        byteInGigabyte = 1073741824
-        if bytesInCurrentFolder < byteInGigabyte - 1:
-            return f'{round(bytesInCurrentFolder * BYTE_TO_MEGABYTE, 2)} MB'
-        else:
-            return f'{round(bytesInCurrentFolder * BYTE_TO_GIGABYTE, 2)} GB'
+        # (min, max) of the size filter in bytes
+        unit = SIZE_UNITS[self.sizeType.currentText()]
+        return round(self.sizeLo.value() * unit, 2), round(self.sizeHi.value() * unit, 2)
 
     ### FILE DURATION METHODS ###
     
@@ -1351,10 +1147,9 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
             self.durationHi.setValue(lo)
     
     def convertToSeconds(self):
-        secondsInMinute = 60
-        if self.durationType.currentText() == 'm':
-            self.minDuration = self.durationLo.value() * secondsInMinute
-            self.maxDuration = self.durationHi.value() * secondsInMinute
+        # (min, max) of the length filter in seconds
+        unit = DURATION_UNITS[self.durationType.currentText()]
+        return self.durationLo.value() * unit, self.durationHi.value() * unit
 
     ### KEYWORDS AND EXTENSION METHODS ###
 
@@ -1363,20 +1158,27 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
         self.incKeysEdit.setText(self.excKeysEdit.text())
         self.excKeysEdit.setText(include)
 
+        includeFile = self.incKeysFileEdit.text()
+        self.incKeysFileEdit.setText(self.excKeysFileEdit.text())
+        self.excKeysFileEdit.setText(includeFile)
+
+    def browseKeywordFile(self, edit):
+        keywordFile, _ = QFileDialog.getOpenFileName(self, 'Select Keyword File', edit.text(), 'Text (*.txt);;All Files (*)')
+        if keywordFile:
+            edit.setText(keywordFile)
+
     def switchExts(self):
         include = self.incExtsEdit.text()
         self.incExtsEdit.setText(self.excExtsEdit.text())
         self.excExtsEdit.setText(include)
 
-    def stringToList(self, string):
-        li = list(string.split(' '))
-        if len(li) == 1 and li[0] == '':
-            return []
-        else:
-            return li
-
     ### SETTINGS METHODS ###
 
+    def widgetMembers(self):
+        # (name, widget) pairs of the window sorted by name. Same order as inspect.getmembers,
+        # without reading every attribute Qt defines on the class
+        return sorted((name, obj) for name, obj in vars(self).items() if isinstance(obj, QWidget))
+
     def closeEvent(self, event):
         # Saves geometry, help, invalid and tab position
         self.globalSettingsSave()
@@ -1386,7 +1188,7 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
         self.settings.setValue('size', self.size())
         self.settings.setValue('pos', self.pos())
 
-        for name, obj in inspect.getmembers(self):
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QCheckBox) and (name in ['showInvalid', 'showHelp']):
                 value = obj.isChecked()
                 self.settings.setValue(name, value)
@@ -1400,7 +1202,7 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
         self.resize(self.settings.value('size', QSize(500, 500)))
         self.move(self.settings.value('pos', QPoint(60, 60)))
 
-        for name, obj in inspect.getmembers(self):
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QCheckBox) and (name in ['showInvalid', 'showHelp']):
                 value = self.settings.value(name)
                 if value != None:
@@ -1430,7 +1232,7 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
             self.setWindowTitle(f'{name} - Copy Random Files')
 
     def guiSave(self, settings):
-        for name, obj in inspect.getmembers(self):
+        for name, obj in self.widgetMembers():
             if isinstance(obj, QComboBox):
                 items = []
                 for item in range(obj.count()):
@@ -1466,7 +1268,21 @@ Total runtime:\t{round(endFolderTime - self.startFolderTime, 2)}s
                 settings.setValue(name, value)
 
     def guiRestore(self, settings):
-        for name, obj in inspect.getmembers(self):
+        # Combos with fixed items keep them, a missing or unknown saved choice falls back to the default
+        fixedCombos = {
+            'copyModeCombo': (COPY_MODES, 'copy'),
+            'sizeType': (tuple(SIZE_UNITS), 'MB'),
+            'durationType': (tuple(DURATION_UNITS), 's'),
+        }
+        for name, obj in self.widgetMembers():
+            if name in fixedCombos:
+                items, default = fixedCombos[name]
+                obj.clear()
+                obj.addItems(items)
+                value = settings.value(f'current{name}')
+                obj.setCurrentIndex(obj.findText(value if value in items else default))
+                continue
+
             if isinstance(obj, QComboBox):
                 obj.clear()
                 allItems = (settings.value(name))
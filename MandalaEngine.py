@@ -0,0 +1,2784 @@
+# Run engine of Copy Random Files, usable without Qt
+# Holds the file selection, filters and copying behind Mandala and RunOptions, and a
+# command line for headless runs:
+#   python MandalaEngine.py --root /music --dest /picks --files 20
+#   python MandalaEngine.py --config config.ini
+#   python MandalaEngine.py --show-log "/picks/!picks_log.jsonl"
+# A .ini saved with Save in the window can be used as is, flags given next to it override it.
+
+import re
+import os
+import math
+import errno
+import heapq
+import sys
+import shutil
+import random
+import array
+import pickle
+import struct
+import json
+import hashlib
+import argparse
+import datetime
+import threading
+import collections
+import configparser
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
+
+def cacheDirectory():
+    # Per-user cache folder for Mandala's on-disk data (indexes, metadata)
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    elif sys.platform == 'darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    path = Path(base) / 'Jang' / 'Mandala'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class DirectoryIndex:
+    # Persistent listing cache for one root folder.
+    # Maps absolute directory paths to (mtime_ns, names, sizes, mtimes, isStatted) where folders
+    # have a size of -1, so walking the tree needs no stat calls beyond one per directory and run.
+    # A directory is only re-listed when its mtime no longer matches the cached one.
+    # Files are only statted for callers that ask for sizes, until then their size and mtime are 0
+    VERSION = 4
+    MANIFEST = 'indexes.json'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        key = hashlib.sha1(os.path.normcase(self.root).encode('utf-8')).hexdigest()[:16]
+        self.indexFile = cacheDirectory() / f'index_{key}.pickle'
+        self.listings = {}
+        self.verified = set()
+        self.isDirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.indexFile, 'rb') as f:
+                data = pickle.load(f)
+            if data['version'] == self.VERSION and data['root'] == self.root:
+                self.listings = data['listings']
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # A corrupt or outdated index is simply rebuilt
+            self.listings = {}
+
+    def save(self):
+        dummyFile = self.indexFile.with_suffix('.tmp')
+        try:
+            if self.isDirty:
+                with open(dummyFile, 'wb') as f:
+                    pickle.dump({'version': self.VERSION, 'root': self.root, 'listings': self.listings}, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(dummyFile, self.indexFile)
+                self.isDirty = False
+            self.prune()
+        except OSError:
+            # The index is only a cache, a failed save costs a slower next start
+            pass
+
+    def prune(self):
+        # The manifest lists the root of every saved index. Indexes of roots that are gone are
+        # deleted, so temporary or removed roots don't leave their listings behind. Indexes
+        # missing from it were saved by an older version and would be rebuilt anyway, they go
+        # once they are a day old so one another process is just saving is left alone
+        manifestFile = self.indexFile.with_name(self.MANIFEST)
+        try:
+            with open(manifestFile, 'r', encoding='utf-8') as f:
+                roots = json.load(f)
+        except (OSError, ValueError):
+            roots = {}
+        roots[self.indexFile.name] = self.root
+        for name, root in list(roots.items()):
+            if not os.path.isdir(root):
+                del roots[name]
+                removeFile(self.indexFile.with_name(name))
+        for path in self.indexFile.parent.glob('index_*.pickle'):
+            if path.name not in roots and time() - path.stat().st_mtime > 86400:
+                removeFile(path)
+        dummyFile = manifestFile.with_suffix('.tmp')
+        with open(dummyFile, 'w', encoding='utf-8') as f:
+            json.dump(roots, f)
+        os.replace(dummyFile, manifestFile)
+
+    def startRun(self):
+        # Every directory is checked against the disk once per run
+        self.verified = set()
+
+    def scandir(self, path, isStatFiles=False):
+        # Returns (names, sizes, mtimes) for an absolute directory path, raises OSError like os.scandir.
+        # Entries that are neither files nor folders (broken links, sockets) are left out.
+        # isStatFiles re-lists a folder whose files weren't statted yet
+        if path in self.verified and (self.listings[path][4] or not isStatFiles):
+            return self.listings[path][1:4]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = self.listings.get(path)
+            if cached is None or cached[0] != mtime or (isStatFiles and not cached[4]):
+                cached = (mtime,) + self.listDirectory(path, isStatFiles) + (isStatFiles,)
+                self.listings[path] = cached
+                self.isDirty = True
+        except OSError:
+            if self.listings.pop(path, None) is not None:
+                self.isDirty = True
+            raise
+        self.verified.add(path)
+        return cached[1:4]
+
+    @staticmethod
+    def listDirectory(path, isStatFiles):
+        # On most systems is_dir and is_file come with the listing, only stat costs a call per file
+        names = []
+        sizes = []
+        mtimes = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        size = mtime = -1
+                    elif not entry.is_file():
+                        continue
+                    elif isStatFiles:
+                        stat = entry.stat()
+                        size = stat.st_size
+                        mtime = stat.st_mtime_ns
+                    else:
+                        size = mtime = 0
+                except OSError:
+                    continue
+                names.append(entry.name)
+                sizes.append(size)
+                mtimes.append(mtime)
+        return names, sizes, mtimes
+
+class CandidateSampler:
+    # Draws distinct indices into a flat candidate list.
+    # Without weights every draw is uniform and O(1) (swap with the last item and pop).
+    # With log weights the indices come out in weighted order without replacement, using
+    # exponential race keys kept in a heap.
+    def __init__(self, count, logWeights=None):
+        self.count = count
+        self.logWeights = logWeights
+        self.reset()
+
+    def reset(self):
+        if self.logWeights is None:
+            self.pool = list(range(self.count))
+        else:
+            self.pool = [(self.raceKey(w), i) for i, w in enumerate(self.logWeights)]
+            heapq.heapify(self.pool)
+
+    def raceKey(self, logWeight):
+        return math.log(random.expovariate(1) or sys.float_info.min) - logWeight
+
+    def draw(self):
+        if not self.pool:
+            return None
+        if self.logWeights is None:
+            i = random.randrange(len(self.pool))
+            self.pool[i], self.pool[-1] = self.pool[-1], self.pool[i]
+            return self.pool.pop()
+        return heapq.heappop(self.pool)[1]
+
+    def putBack(self, indices):
+        # Returns skipped candidates so they can be drawn again later in the run
+        if self.logWeights is None:
+            self.pool.extend(indices)
+            return
+        for i in indices:
+            heapq.heappush(self.pool, (self.raceKey(self.logWeights[i]), i))
+
+    def __len__(self):
+        return len(self.pool)
+
+class FenwickTree:
+    # Running totals over a list of non-negative integer weights. Any weight can be changed and
+    # the item a random offset into the total falls on found in O(log n)
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.weights = list(weights)
+        self.total = sum(self.weights)
+        self.tree = [0] + self.weights
+        for i in range(1, self.size + 1):
+            j = i + (i & -i)
+            if j <= self.size:
+                self.tree[j] += self.tree[i]
+
+    def set(self, i, weight):
+        delta = weight - self.weights[i]
+        if not delta:
+            return
+        self.weights[i] = weight
+        self.total += delta
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, offset):
+        # Index of the item that covers offset, for 0 <= offset < total
+        i = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            j = i + step
+            if j <= self.size and self.tree[j] <= offset:
+                i = j
+                offset -= self.tree[j]
+            step >>= 1
+        return i
+
+class QuotaSampler(CandidateSampler):
+    # CandidateSampler for runs with top and bottom weights, the candidates are grouped by the
+    # folder they're in. A folder that used up its quota is blocked and its candidates drop out
+    # of the draws until it's unblocked, instead of being drawn and put back over and over.
+    # Uniform draws pick a folder by its number of candidates left from a Fenwick tree and then
+    # a candidate in it, weighted draws keep a race heap per folder and a heap of their heads
+    def __init__(self, leaves, topOf, logWeights=None):
+        groupIds = {}
+        self.groupOf = array.array('i', (groupIds.setdefault(leaf, len(groupIds)) for leaf in leaves))
+        self.groupIds = groupIds
+        self.leafKeys = list(groupIds)
+        self.topKeys = [topOf(leaf) for leaf in self.leafKeys]
+        self.topGroups = collections.defaultdict(list)
+        for g, top in enumerate(self.topKeys):
+            self.topGroups[top].append(g)
+        self.blockedTops = set()
+        self.blockedLeaves = set()
+        super().__init__(len(self.groupOf), logWeights)
+
+    def reset(self):
+        self.pools = [[] for _ in self.leafKeys]
+        if self.logWeights is None:
+            for i, g in enumerate(self.groupOf):
+                self.pools[g].append(i)
+            self.fenwick = FenwickTree([len(pool) if self.isOpen(g) else 0 for g, pool in enumerate(self.pools)])
+        else:
+            for i, g in enumerate(self.groupOf):
+                self.pools[g].append((self.raceKey(self.logWeights[i]), i))
+            self.heads = []
+            for g, pool in enumerate(self.pools):
+                heapq.heapify(pool)
+                self.pushHead(g)
+        self.remaining = self.count
+
+    def isOpen(self, g):
+        return self.leafKeys[g] not in self.blockedLeaves and self.topKeys[g] not in self.blockedTops
+
+    def pushHead(self, g):
+        # Entries whose folder was blocked or drew its head since are skipped when they come up
+        if self.pools[g] and self.isOpen(g):
+            heapq.heappush(self.heads, (self.pools[g][0][0], g))
+
+    def update(self, g):
+        if self.logWeights is None:
+            self.fenwick.set(g, len(self.pools[g]) if self.isOpen(g) else 0)
+        else:
+            self.pushHead(g)
+
+    def draw(self):
+        if self.logWeights is None:
+            if not self.fenwick.total:
+                return None
+            g = self.fenwick.find(random.randrange(self.fenwick.total))
+            pool = self.pools[g]
+            k = random.randrange(len(pool))
+            pool[k], pool[-1] = pool[-1], pool[k]
+            i = pool.pop()
+            self.fenwick.set(g, len(pool))
+        else:
+            while True:
+                if not self.heads:
+                    return None
+                key, g = heapq.heappop(self.heads)
+                pool = self.pools[g]
+                if pool and pool[0][0] == key and self.isOpen(g):
+                    break
+            i = heapq.heappop(pool)[1]
+            self.pushHead(g)
+        self.remaining -= 1
+        return i
+
+    def putBack(self, indices):
+        for i in indices:
+            g = self.groupOf[i]
+            pool = self.pools[g]
+            if self.logWeights is None:
+                pool.append(i)
+                self.update(g)
+                continue
+            heapq.heappush(pool, (self.raceKey(self.logWeights[i]), i))
+            if pool[0][1] == i:
+                self.pushHead(g)
+        self.remaining += len(indices)
+
+    def setBlocked(self, key, isTop, isBlocked):
+        # Blocks or unblocks a top folder (every folder under it) or a single leaf folder
+        blocked = self.blockedTops if isTop else self.blockedLeaves
+        if (key in blocked) == isBlocked:
+            return
+        if isBlocked:
+            blocked.add(key)
+        else:
+            blocked.remove(key)
+        groups = self.topGroups.get(key, ()) if isTop else [self.groupIds[key]] if key in self.groupIds else ()
+        for g in groups:
+            self.update(g)
+
+    def unblockAll(self):
+        tops, leaves = self.blockedTops, self.blockedLeaves
+        self.blockedTops, self.blockedLeaves = set(), set()
+        for key in tops:
+            for g in self.topGroups.get(key, ()):
+                self.update(g)
+        for key in leaves:
+            if key in self.groupIds:
+                self.update(self.groupIds[key])
+
+    def __len__(self):
+        return self.remaining
+
+class TouchedTree:
+    # Touched state of the files and folders under one root, addressed by integer node IDs.
+    # The children of a folder get consecutive IDs when it is first listed, and every folder
+    # keeps the number of children that are still untouched. When that number drops to zero
+    # the folder counts as touched itself and its parent is updated, so exhausted folders are
+    # known as soon as their last file is used and every check is a single array lookup.
+    ROOT = 0
+    USED = 1      # file picked, or folder with no untouched children left
+    WEIGHT = 2    # folder that reached its weight in the current destination folder
+    SEARCHED = 4  # set on the root when the whole tree was searched
+    def __init__(self, root, scandir):
+        self.scandir = scandir
+        self.folderIds = {root: self.ROOT}
+        self.flags = bytearray(1)
+        self.parents = array.array('i', [-1])
+        self.firstChild = array.array('i', [-1])
+        self.childCounts = array.array('i', [-1])
+        self.remaining = array.array('i', [0])
+
+    def listing(self, node, path):
+        # Returns (names, sizes, mtimes) of a folder and hands out IDs to its children on first use.
+        # A folder that can't be listed counts as empty and raises OSError like os.scandir
+        try:
+            listing = self.scandir(path)
+        except OSError:
+            if self.childCounts[node] < 0:
+                self.addChildren(node, path, [], [])
+            raise
+        if self.childCounts[node] < 0:
+            self.addChildren(node, path, listing[0], listing[1])
+        return listing
+
+    def addChildren(self, node, path, names, sizes):
+        count = len(names)
+        self.firstChild[node] = len(self.flags)
+        self.childCounts[node] = count
+        self.remaining[node] = count
+        for i, size in enumerate(sizes):
+            if size < 0:
+                self.folderIds[os.path.join(path, names[i])] = len(self.flags) + i
+        self.flags.extend(bytes(count))
+        self.parents.extend([node] * count)
+        self.firstChild.extend([-1] * count)
+        self.childCounts.extend([-1] * count)
+        self.remaining.extend([0] * count)
+        if count == 0:
+            self.touch(node)
+
+    def childOf(self, node, index):
+        return self.firstChild[node] + index
+
+    def folderId(self, path):
+        # ID of a folder under the root, listing its parents if they weren't reached yet. None if it's gone
+        node = self.folderIds.get(path)
+        if node is not None:
+            return node
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        parentNode = self.folderId(parent)
+        if parentNode is None:
+            return None
+        try:
+            self.listing(parentNode, parent)
+        except OSError:
+            pass
+        return self.folderIds.get(path)
+
+    def isTouched(self, node):
+        return self.flags[node] != 0
+
+    def touch(self, node, flag=USED):
+        # Sets a flag and, if the node just became touched, walks up the parents whose last
+        # untouched child it was
+        while node >= 0:
+            wasTouched = self.flags[node] != 0
+            self.flags[node] |= flag
+            if wasTouched:
+                return
+            node = self.parents[node]
+            if node < 0:
+                return
+            self.remaining[node] -= 1
+            if self.remaining[node] > 0:
+                return
+            flag = self.USED
+
+    def untouch(self, node, flag=USED):
+        # Clears a flag and, if the node is free again, reopens the parents it had used up
+        while node >= 0:
+            if not self.flags[node] & flag:
+                return
+            self.flags[node] &= ~flag
+            if self.flags[node] != 0:
+                return
+            node = self.parents[node]
+            if node < 0:
+                return
+            self.remaining[node] += 1
+            if self.remaining[node] > 1:
+                return
+            flag = self.USED
+
+    def reset(self):
+        # Clears every flag but keeps the IDs, empty folders are used up again right away
+        self.flags = bytearray(len(self.flags))
+        self.remaining = array.array('i', self.childCounts)
+        for node, count in enumerate(self.childCounts):
+            if count == 0:
+                self.touch(node)
+
+AUDIO_EXTENSIONS = {'.wav', '.wave', '.rf64', '.w64', '.aif', '.aiff', '.aifc', '.flac', '.ogg', '.oga', '.opus',
+                    '.mp3', '.caf', '.au', '.snd', '.voc', '.sd2', '.paf', '.iff', '.svx', '.sf', '.mat', '.pvf',
+                    '.xi', '.htk', '.mpc'}
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLERATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+def readAudioHeader(source):
+    # Reads the duration from the file's own header, touching only a few KB.
+    # Returns (duration, samplerate), (None, None) for files that are not audio at all,
+    # or None if the format needs a full decoder (the caller falls back to soundfile/mutagen)
+    try:
+        with open(source, 'rb') as f:
+            head = f.read(4096)
+            size = os.fstat(f.fileno()).st_size
+            if head[:4] in (b'RIFF', b'RF64') and head[8:12] == b'WAVE':
+                return readWavHeader(f, head)
+            if head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+                return readAiffHeader(f)
+            if head[:4] == b'OggS':
+                return readOggHeader(f, head, size)
+            # FLAC and MP3 may start with an ID3v2 tag
+            start = 0
+            if head[:3] == b'ID3' and len(head) >= 10:
+                start = 10 + ((head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | head[9] & 0x7f)
+                f.seek(start)
+                head = f.read(4096)
+                if head[:4] == b'fLaC':
+                    return readFlacHeader(head)
+                return readMp3Header(f, head, start, size)
+            if head[:4] == b'fLaC':
+                return readFlacHeader(head)
+            if len(head) >= 4 and head[0] == 0xff and head[1] & 0xe0 == 0xe0:
+                return readMp3Header(f, head, start, size)
+    except (OSError, struct.error, ValueError, ZeroDivisionError, IndexError):
+        return None
+    if Path(source).suffix.lower() in AUDIO_EXTENSIONS:
+        return None
+    return None, None
+
+def readWavHeader(f, head):
+    # Walks the RIFF chunks: fmt for the rates, fact or data for the length (ds64 for RF64)
+    f.seek(12)
+    sampleRate = byteRate = numSamples = dataSize = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunkId, chunkSize = struct.unpack('<4sI', chunk)
+        if chunkId == b'fmt ':
+            audioFormat, channels, sampleRate, byteRate = struct.unpack('<HHII', f.read(12))
+            f.seek(chunkSize - 12 + (chunkSize & 1), 1)
+        elif chunkId == b'ds64':
+            dataSize = struct.unpack('<QQ', f.read(16))[1]
+            f.seek(chunkSize - 16 + (chunkSize & 1), 1)
+        elif chunkId == b'fact':
+            numSamples = struct.unpack('<I', f.read(4))[0]
+            f.seek(chunkSize - 4 + (chunkSize & 1), 1)
+        elif chunkId == b'data':
+            if dataSize is None:
+                dataSize = chunkSize
+            break
+        else:
+            f.seek(chunkSize + (chunkSize & 1), 1)
+    if not sampleRate:
+        return None
+    # PCM and float are timed by their byte rate, compressed formats by their fact chunk
+    if audioFormat not in (1, 3, 0xfffe) and numSamples:
+        return numSamples / sampleRate, sampleRate
+    if dataSize is None or not byteRate:
+        return None
+    return dataSize / byteRate, sampleRate
+
+def readAiffHeader(f):
+    # COMM holds the frame count and an 80-bit extended float sample rate
+    f.seek(12)
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunkId, chunkSize = struct.unpack('>4sI', chunk)
+        if chunkId == b'COMM':
+            channels, numFrames, sampleSize, exponent, mantissa = struct.unpack('>HIHHQ', f.read(18))
+            exponent &= 0x7fff
+            if exponent == 0 and mantissa == 0:
+                return None
+            sampleRate = mantissa * 2.0 ** (exponent - 16383 - 63)
+            return numFrames / sampleRate, int(sampleRate)
+        f.seek(chunkSize + (chunkSize & 1), 1)
+
+def readFlacHeader(head):
+    # STREAMINFO is always the first metadata block
+    if len(head) < 42 or head[4] & 0x7f != 0:
+        return None
+    packed = int.from_bytes(head[18:26], 'big')
+    sampleRate = packed >> 44
+    totalSamples = packed & 0xfffffffff
+    if not sampleRate or not totalSamples:
+        return None
+    return totalSamples / sampleRate, sampleRate
+
+def readOggHeader(f, head, size):
+    # The first page carries the codec's identification header, the last page's granule
+    # position is the stream length in samples
+    segments = head[26]
+    packet = head[27 + segments:]
+    preSkip = 0
+    if packet[:7] == b'\x01vorbis':
+        sampleRate = struct.unpack('<I', packet[12:16])[0]
+    elif packet[:8] == b'OpusHead':
+        # Opus granules always count at 48 kHz
+        preSkip = struct.unpack('<H', packet[10:12])[0]
+        sampleRate = 48000
+    elif packet[:5] == b'\x7fFLAC':
+        sampleRate = int.from_bytes(packet[27:30], 'big') >> 4
+    else:
+        return None
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    last = tail.rfind(b'OggS')
+    if last == -1 or last + 14 > len(tail) or not sampleRate:
+        return None
+    granule = struct.unpack('<q', tail[last + 6:last + 14])[0]
+    if granule <= 0:
+        return None
+    return max(0, granule - preSkip) / sampleRate, sampleRate
+
+def readMp3Header(f, head, start, size):
+    # First frame header, then a Xing/Info or VBRI frame count if there is one,
+    # otherwise the stream is timed as constant bitrate
+    if len(head) < 4 or head[0] != 0xff or head[1] & 0xe0 != 0xe0:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}.get(head[1] >> 3 & 3)
+    layer = {3: 1, 2: 2, 1: 3}.get(head[1] >> 1 & 3)
+    bitrateIndex = head[2] >> 4
+    rateIndex = head[2] >> 2 & 3
+    if version is None or layer is None or bitrateIndex in (0, 15) or rateIndex == 3:
+        return None
+    sampleRate = MP3_SAMPLERATES[version][rateIndex]
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrateIndex] * 1000
+    isMono = head[3] >> 6 == 3
+    if layer == 1:
+        samplesPerFrame = 384
+    elif layer == 2 or version == 1:
+        samplesPerFrame = 1152
+    else:
+        samplesPerFrame = 576
+
+    if version == 1:
+        sideInfo = 17 if isMono else 32
+    else:
+        sideInfo = 9 if isMono else 17
+    xing = 4 + sideInfo
+    if head[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', head[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', head[xing + 8:xing + 12])[0]
+            samples = frames * samplesPerFrame
+            # A LAME tag after the Xing fields records the encoder delay and padding
+            lame = xing + 8 + 4 * bin(flags & 0xb).count('1') + (100 if flags & 4 else 0)
+            if head[lame:lame + 4] == b'LAME':
+                gapless = int.from_bytes(head[lame + 21:lame + 24], 'big')
+                samples = max(0, samples - (gapless >> 12) - (gapless & 0xfff))
+            return samples / sampleRate, sampleRate
+    if head[36:40] == b'VBRI':
+        frames = struct.unpack('>I', head[50:54])[0]
+        return frames * samplesPerFrame / sampleRate, sampleRate
+
+    audioSize = size - start
+    f.seek(-128, 2)
+    if f.read(3) == b'TAG':
+        audioSize -= 128
+    return audioSize * 8 / bitrate, sampleRate
+
+def probeAudio(source):
+    # (duration in seconds, sample rate) of an audio file, (None, None) if it can't be read.
+    # Module level so it can run in DurationProber's worker processes
+    header = readAudioHeader(source)
+    if header is not None:
+        return header
+    # The decoders are only loaded for files the header readers can't handle
+    import soundfile
+    from mutagen.mp3 import MP3
+    try:
+        with soundfile.SoundFile(source) as sound:
+            return len(sound) / sound.samplerate, sound.samplerate
+    except RuntimeError:
+        if Path(source).suffix == '.mp3':
+            try:
+                info = MP3(source).info
+                return info.length, info.sample_rate
+            except:
+                return None, None
+        return None, None
+    except:
+        return None, None
+
+class MetadataCache:
+    # SQLite store of probe results and content hashes keyed by (absolute path, size, mtime_ns).
+    # A file that was changed since it was probed or hashed is a miss. At most maxEntries rows
+    # are kept in each table, the least recently used ones are evicted when the cache is closed
+    MAX_ENTRIES = 1000000
+    TABLES = ('audio', 'hashes')
+
+    def __init__(self, maxEntries=MAX_ENTRIES):
+        # Only runs with the Length filter or duplicate skipping use the cache, so sqlite3 is loaded here
+        import sqlite3
+        self.maxEntries = maxEntries
+        self.db = sqlite3.connect(str(cacheDirectory() / 'metadata.sqlite'), check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS audio (
+                            path TEXT PRIMARY KEY,
+                            size INTEGER,
+                            mtime INTEGER,
+                            duration REAL,
+                            samplerate INTEGER,
+                            isReadable INTEGER,
+                            used INTEGER)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS audioUsed ON audio (used)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS hashes (
+                            path TEXT PRIMARY KEY,
+                            size INTEGER,
+                            mtime INTEGER,
+                            partial BLOB,
+                            full BLOB,
+                            used INTEGER)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS hashesUsed ON hashes (used)')
+        self.now = int(time())
+        self.hits = {table: [] for table in self.TABLES}
+
+    def get(self, path, size, mtime):
+        # Returns (duration, samplerate) or None if the file is not cached
+        row = self.db.execute('SELECT size, mtime, duration, samplerate FROM audio WHERE path = ?', (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        self.hits['audio'].append((self.now, path))
+        return row[2], row[3]
+
+    def put(self, path, size, mtime, duration, samplerate):
+        self.db.execute('INSERT OR REPLACE INTO audio VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (path, size, mtime, duration, samplerate, duration is not None, self.now))
+
+    def durationsUnder(self, folder):
+        # (path, size, mtime, duration) of every probed file under folder, in one range scan of the key
+        prefix = os.path.join(folder, '')
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self.db.execute('SELECT path, size, mtime, duration FROM audio WHERE path >= ? AND path < ?', (prefix, end))
+
+    def getHashes(self, path, size, mtime):
+        # Returns (partial hash, full hash) where either may be None, or None if the file is not cached
+        row = self.db.execute('SELECT size, mtime, partial, full FROM hashes WHERE path = ?', (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        self.hits['hashes'].append((self.now, path))
+        return row[2], row[3]
+
+    def putHashes(self, path, size, mtime, partial, full):
+        self.db.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+                        (path, size, mtime, partial, full, self.now))
+
+    def evict(self):
+        for table in self.TABLES:
+            count = self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if count > self.maxEntries:
+                self.db.execute(f'DELETE FROM {table} WHERE path IN (SELECT path FROM {table} ORDER BY used LIMIT ?)',
+                                (count - self.maxEntries,))
+
+    def vacuum(self):
+        # Drops evicted rows and gives the freed pages back to the disk
+        self.evict()
+        self.db.commit()
+        self.db.execute('VACUUM')
+
+    def close(self):
+        for table in self.TABLES:
+            self.db.executemany(f'UPDATE {table} SET used = ? WHERE path = ?', self.hits[table])
+            self.hits[table] = []
+        self.evict()
+        self.db.commit()
+        self.db.close()
+
+class DurationProber:
+    # Probes audio durations in a process pool. Candidates are prefetched ahead of the
+    # selector and their results collected when the selector gets to them.
+    # Results are read from and written to the metadata cache, so unchanged files are
+    # only ever decoded once
+    def __init__(self, workers, cache):
+        # Loaded here, multiprocessing is slow to import and only the Length filter needs it
+        from concurrent.futures import ProcessPoolExecutor
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache = cache
+        self.futures = {}
+        self.known = {}
+
+    def lookup(self, source, key=None):
+        # Returns the cache key (size, mtime_ns) of the file and its cached (duration, samplerate) or None.
+        # Callers that already know size and mtime pass them as key and save the stat
+        if key is None:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                return None, None
+            key = (stat.st_size, stat.st_mtime_ns)
+        return key, self.cache.get(source, *key)
+
+    def prefetch(self, source, key=None):
+        if source in self.futures or source in self.known:
+            return
+        key, cached = self.lookup(source, key)
+        if cached is not None or key is None:
+            self.known[source] = cached
+        else:
+            self.futures[source] = (key, self.executor.submit(probeAudio, source))
+
+    def duration(self, source, key=None):
+        if source in self.known:
+            cached = self.known.pop(source)
+            return cached[0] if cached is not None else None
+
+        if source in self.futures:
+            key, future = self.futures.pop(source)
+            try:
+                result = future.result()
+            except Exception:
+                # A broken worker pool falls back to probing here
+                result = probeAudio(source)
+        else:
+            key, cached = self.lookup(source, key)
+            if cached is not None:
+                return cached[0]
+            result = probeAudio(source)
+
+        if key is not None:
+            self.cache.put(source, *key, *result)
+        return result[0]
+
+    def cancel(self, sources):
+        for source in sources:
+            self.known.pop(source, None)
+            entry = self.futures.pop(source, None)
+            if entry is not None:
+                entry[1].cancel()
+
+    def shutdown(self):
+        # The cache belongs to the run, which closes it
+        self.cancel(list(self.futures))
+        self.executor.shutdown()
+
+class KeywordMatcher:
+    # Tells whether a name contains any keyword of a list.
+    # Plain keywords are compiled into an Aho-Corasick automaton once the list is long, so
+    # every name is scanned once no matter how many keywords there are. Short lists and
+    # keywords using regex syntax are joined into one case-insensitive pattern instead
+    AUTOMATON_THRESHOLD = 16
+    REGEX_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+    def __init__(self, keywords):
+        literals = [k for k in keywords if not self.REGEX_CHARACTERS.intersection(k)]
+        if len(literals) >= self.AUTOMATON_THRESHOLD:
+            patterns = [k for k in keywords if self.REGEX_CHARACTERS.intersection(k)]
+            self.buildAutomaton(literals)
+        else:
+            patterns = list(keywords)
+            self.goto = None
+        self.pattern = self.compilePatterns(patterns)
+
+    @staticmethod
+    def compilePatterns(keywords):
+        # A keyword that doesn't compile is matched literally instead
+        if not keywords:
+            return None
+        parts = []
+        for keyword in keywords:
+            try:
+                re.compile(keyword)
+                parts.append(f'(?:{keyword})')
+            except re.error:
+                parts.append(re.escape(keyword))
+        return re.compile('|'.join(parts), re.I)
+
+    def buildAutomaton(self, keywords):
+        # Trie of the lowercased keywords plus failure links, isEnd marks nodes where some keyword ends
+        self.goto = [{}]
+        self.fail = [0]
+        self.isEnd = [False]
+        for keyword in keywords:
+            node = 0
+            for ch in keyword.lower():
+                nextNode = self.goto[node].get(ch)
+                if nextNode is None:
+                    nextNode = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.isEnd.append(False)
+                    self.goto[node][ch] = nextNode
+                node = nextNode
+            self.isEnd[node] = True
+
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nextNode in self.goto[node].items():
+                queue.append(nextNode)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nextNode] = self.goto[fail].get(ch, 0)
+                self.isEnd[nextNode] = self.isEnd[nextNode] or self.isEnd[self.fail[nextNode]]
+
+    def search(self, name):
+        if self.goto is not None:
+            goto, fail, isEnd = self.goto, self.fail, self.isEnd
+            node = 0
+            if isEnd[0]:
+                return True
+            for ch in name.lower():
+                while node and ch not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(ch, 0)
+                if isEnd[node]:
+                    return True
+        return self.pattern is not None and self.pattern.search(name) is not None
+
+def readKeywordFile(path):
+    # One keyword per line, blank lines and lines starting with # are skipped
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+class FileFilter:
+    # The Keywords, Extensions, Size and Length settings compiled once per run.
+    # Checks go from cheapest to most expensive: extension set lookups, one keyword
+    # matcher per list, the size range and last the duration probe
+    def __init__(self, keywords=(), notKeywords=(), extensions=(), notExtensions=(),
+                 sizeRange=None, durationRange=None, prober=None):
+        self.extensions = {self.normalizeExtension(e) for e in extensions}
+        self.notExtensions = {self.normalizeExtension(e) for e in notExtensions}
+        self.keywordMatcher = KeywordMatcher(keywords) if keywords else None
+        self.notKeywordMatcher = KeywordMatcher(notKeywords) if notKeywords else None
+        self.sizeRange = sizeRange
+        self.durationRange = durationRange
+        self.prober = prober
+
+    @staticmethod
+    def normalizeExtension(extension):
+        return extension.lstrip('.').lower()
+
+    def isValidName(self, name):
+        stem, suffix = os.path.splitext(name)
+        suffix = suffix[1:].lower()
+        if suffix in self.notExtensions:
+            return False
+        if self.extensions and suffix not in self.extensions:
+            return False
+        if self.notKeywordMatcher is not None and self.notKeywordMatcher.search(stem):
+            return False
+        if self.keywordMatcher is not None and not self.keywordMatcher.search(stem):
+            return False
+        return True
+
+    def isValidSize(self, size):
+        return self.sizeRange is None or self.sizeRange[0] <= size <= self.sizeRange[1]
+
+    def isValidNameAndSize(self, name, size):
+        # Cheap checks that need no file access
+        return self.isValidName(name) and self.isValidSize(size)
+
+    def isValidDuration(self, source, key=None):
+        # If a duration can be get it will be checked, otherwise the file is valid
+        if self.durationRange is None:
+            return True
+        duration = self.prober.duration(source, key)
+        if duration is None:
+            return True
+        return self.durationRange[0] <= duration <= self.durationRange[1]
+
+    def isValid(self, source, size):
+        return self.isValidNameAndSize(os.path.basename(source), size) and self.isValidDuration(source)
+
+class CopyPool:
+    # Bounded pool of copy threads. At most maxInFlight copies run at once and their
+    # results are handed to the onDone callbacks in submission order, on the thread
+    # that calls submit or drain. With maxInFlight 1 copies run inline
+    def __init__(self, maxInFlight):
+        self.maxInFlight = max(1, maxInFlight)
+        self.inFlight = collections.deque()
+        if self.maxInFlight > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.maxInFlight)
+        else:
+            self.executor = None
+
+    def submit(self, function, args, onDone):
+        if self.executor is None:
+            onDone(function(*args))
+            return
+        while len(self.inFlight) >= self.maxInFlight:
+            self.finishOldest()
+        self.inFlight.append((self.executor.submit(function, *args), onDone))
+
+    def finishOldest(self):
+        future, onDone = self.inFlight.popleft()
+        onDone(future.result())
+
+    def drain(self):
+        while self.inFlight:
+            self.finishOldest()
+
+    def shutdown(self):
+        self.drain()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __len__(self):
+        return len(self.inFlight)
+
+class FileCopier:
+    # Copies files with the cheapest path the filesystems allow. A copy first tries a reflink
+    # (the target shares the source's blocks on btrfs and XFS), then copy_file_range within a
+    # device, then sendfile, and plain reads and writes last. Only the data is copied, not the
+    # permission bits. A path that fails for a pair of devices isn't tried for that pair again.
+    # The hardlink and symlink modes link the target to the source instead, hardlinks fall
+    # back to copying across devices
+    FICLONE = 0x40049409
+    CHUNK = 1 << 30
+    # Errors that mean a path isn't supported here rather than that the copy failed
+    UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM}
+
+    def __init__(self, mode='copy'):
+        if mode not in COPY_MODES:
+            raise ValueError(f'Copy mode must be one of {", ".join(COPY_MODES)}, not {mode!r}')
+        self.mode = mode
+        self.unsupported = set()
+        try:
+            import fcntl
+            self.ioctl = fcntl.ioctl
+        except ImportError:
+            self.ioctl = None
+        self.paths = [(name, function) for name, function in (
+            ('reflink', self.reflink if self.ioctl and sys.platform.startswith('linux') else None),
+            ('copy_file_range', self.copyFileRange if hasattr(os, 'copy_file_range') else None),
+            ('sendfile', self.sendfile if hasattr(os, 'sendfile') and sys.platform.startswith('linux') else None),
+        ) if function is not None]
+
+    def copy(self, source, target):
+        if self.mode == 'symlink':
+            os.symlink(os.path.abspath(source), target)
+            return
+        if self.mode == 'hardlink':
+            try:
+                os.link(source, target)
+                return
+            except OSError as error:
+                if error.errno != errno.EXDEV:
+                    raise
+        self.copyData(source, target)
+
+    def copyData(self, source, target):
+        # The target is created exclusively, a file that appeared under its name is never overwritten.
+        # A copy that fails takes its partial target with it
+        with open(source, 'rb') as sourceFile, open(target, 'xb') as targetFile:
+            try:
+                self.copyOpenFiles(sourceFile, targetFile)
+            except BaseException:
+                targetFile.close()
+                removeFile(target)
+                raise
+
+    def copyOpenFiles(self, sourceFile, targetFile):
+        sourceFd, targetFd = sourceFile.fileno(), targetFile.fileno()
+        sourceStat = os.fstat(sourceFd)
+        devices = (sourceStat.st_dev, os.fstat(targetFd).st_dev)
+        for name, function in self.paths:
+            if (name, devices) in self.unsupported:
+                continue
+            if name == 'copy_file_range' and devices[0] != devices[1]:
+                continue
+            try:
+                function(sourceFd, targetFd, sourceStat.st_size)
+                return
+            except OSError as error:
+                if error.errno not in self.UNSUPPORTED:
+                    raise
+                self.unsupported.add((name, devices))
+                # Start over, a path can fail after writing part of the file
+                os.lseek(sourceFd, 0, os.SEEK_SET)
+                os.ftruncate(targetFd, 0)
+                os.lseek(targetFd, 0, os.SEEK_SET)
+        shutil.copyfileobj(sourceFile, targetFile, 1 << 20)
+
+    def reflink(self, sourceFd, targetFd, size):
+        self.ioctl(targetFd, self.FICLONE, sourceFd)
+
+    def copyFileRange(self, sourceFd, targetFd, size):
+        offset = 0
+        while offset < size:
+            copied = os.copy_file_range(sourceFd, targetFd, min(self.CHUNK, size - offset))
+            if copied == 0:
+                break
+            offset += copied
+
+    def sendfile(self, sourceFd, targetFd, size):
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(targetFd, sourceFd, offset, min(self.CHUNK, size - offset))
+            if sent == 0:
+                break
+            offset += sent
+
+PARTIAL_HASH_BYTES = 1 << 16
+
+def contentHash(path, limit=None):
+    # BLAKE2 digest of the file's first limit bytes, or of all of it
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        if limit is not None:
+            digest.update(f.read(limit))
+        else:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.digest()
+
+class DestinationIndex:
+    # Names, sizes and content hashes of the files in one destination folder, listed once
+    # when the folder is opened and updated as copies are added. Files are grouped by size,
+    # a partial hash (the first 64 KiB) is only computed when sizes collide and a full hash
+    # only when partial hashes do too. Hashes are read from the path an entry was added with,
+    # files still being copied are hashed from their source until they have landed.
+    # Free names are handed out by allocate, which is safe to call from the copy threads
+    def __init__(self, folder, ignore=()):
+        self.folder = str(folder)
+        self.entries = {}
+        self.bySize = collections.defaultdict(list)
+        self.nextNumbers = {}
+        self.lock = threading.RLock()
+        try:
+            with os.scandir(self.folder) as listing:
+                for entry in listing:
+                    if entry.name in ignore:
+                        continue
+                    try:
+                        if entry.is_file():
+                            self.add(entry.name, entry.stat().st_size, entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def add(self, name, size, hashPath):
+        # entries hold [size, path to hash from, partial hash, full hash]
+        with self.lock:
+            self.entries[name] = [size, hashPath, None, None]
+            self.bySize[size].append(name)
+
+    def landed(self, name):
+        entry = self.entries.get(name)
+        if entry is not None:
+            entry[1] = os.path.join(self.folder, name)
+
+    def remove(self, name):
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is not None:
+                self.bySize[entry[0]].remove(name)
+
+    def allocate(self, name, numbered, start, size, hashPath):
+        # Takes and returns name if it's free, otherwise the first free numbered name, where
+        # numbered is a (head, tail) pair around the number. The next number to try is kept
+        # per pair, so numbers taken once are never looked at again
+        with self.lock:
+            if name is None or name in self.entries:
+                number = max(start, self.nextNumbers.get(numbered, start))
+                while f'{numbered[0]}{number}{numbered[1]}' in self.entries:
+                    number += 1
+                self.nextNumbers[numbered] = number + 1
+                name = f'{numbered[0]}{number}{numbered[1]}'
+            self.add(name, size, hashPath)
+            return name
+
+    def foreign(self, name):
+        # Another program created name since the folder was listed. Its entry now stands for
+        # that file, so the name stays taken and its content is still found
+        with self.lock:
+            self.remove(name)
+            try:
+                self.add(name, os.path.getsize(os.path.join(self.folder, name)), os.path.join(self.folder, name))
+            except OSError:
+                self.add(name, -1, os.path.join(self.folder, name))
+
+    def hashes(self, entry, isFull):
+        try:
+            if entry[2] is None:
+                entry[2] = contentHash(entry[1], PARTIAL_HASH_BYTES)
+            if isFull and entry[3] is None:
+                entry[3] = entry[2] if entry[0] <= PARTIAL_HASH_BYTES else contentHash(entry[1])
+        except OSError:
+            return None
+        return entry[3] if isFull else entry[2]
+
+    def findDuplicate(self, source, size):
+        # Name of a file in the folder with the same content as source, None if there is none
+        with self.lock:
+            names = list(self.bySize.get(size, ()))
+        if not names:
+            return None
+        sourceEntry = [size, source, None, None]
+        sourcePartial = self.hashes(sourceEntry, False)
+        if sourcePartial is None:
+            return None
+        for name in names:
+            entry = self.entries.get(name)
+            if entry is None or self.hashes(entry, False) != sourcePartial:
+                continue
+            sourceFull = self.hashes(sourceEntry, True)
+            if sourceFull is not None and self.hashes(entry, True) == sourceFull:
+                return name
+        return None
+
+class FolderAllocator:
+    # Hands out new folders "name", "name 2", "name 3"... in a parent folder. The parent is
+    # listed once and the numbers already taken are parsed from it, after that each folder
+    # is made with a single mkdir. A name that another program took in the meantime is
+    # skipped. Gaps in the numbering are filled first, like before
+    def __init__(self, parent, name):
+        self.parent = Path(parent)
+        self.name = name
+        self.taken = set()
+        # "name 1" isn't a number of "name", only 2 and up are
+        pattern = re.compile(re.escape(name) + r'(?: ([2-9]|[1-9][0-9]+))?')
+        try:
+            with os.scandir(self.parent) as listing:
+                for entry in listing:
+                    match = pattern.fullmatch(entry.name)
+                    if match:
+                        self.taken.add(int(match.group(1) or 1))
+        except OSError:
+            pass
+        self.nextNumber = 1
+
+    def folderName(self, number):
+        return self.name if number == 1 else f'{self.name} {number}'
+
+    def make(self):
+        # Creates the next free folder and returns its path
+        while True:
+            while self.nextNumber in self.taken:
+                self.nextNumber += 1
+            number = self.nextNumber
+            self.taken.add(number)
+            folder = self.parent / self.folderName(number)
+            try:
+                folder.mkdir()
+                return folder
+            except FileExistsError:
+                continue
+
+class OutputFolder:
+    # One destination folder of a run: its log, its index, how many files it gets and
+    # the weights of the source folders in it. inFlight counts its copies still running
+    def __init__(self, path, numberOfFiles):
+        self.path = path
+        self.log = RunLog(path/f'!{path.name}_log.jsonl')
+        self.index = DestinationIndex(path, ignore={self.log.path.name})
+        self.numberOfFiles = numberOfFiles
+        self.count = 0
+        self.inFlight = 0
+        self.bytes = 0
+        self.weighted = collections.defaultdict(int)
+        self.startTime = perf_counter()
+
+    def isFull(self):
+        return self.count + self.inFlight >= self.numberOfFiles
+
+class SourceDuplicates:
+    # Content of the files selected so far, to skip candidates that are byte-identical to one
+    # of them. Selected files are grouped by size and only hashed when a later candidate has
+    # the same size, first partially and then fully, like DestinationIndex. Hashes are kept in
+    # the metadata cache, so unchanged files are only ever hashed once
+    def __init__(self, cache):
+        self.cache = cache
+        self.bySize = collections.defaultdict(list)
+
+    def reset(self):
+        self.bySize = collections.defaultdict(list)
+
+    def hashes(self, entry, isFull):
+        # entries hold [path, size, partial hash, full hash, cache key]
+        try:
+            if entry[4] is None:
+                stat = os.stat(entry[0])
+                entry[4] = (stat.st_size, stat.st_mtime_ns)
+                cached = self.cache.getHashes(entry[0], *entry[4])
+                if cached is not None:
+                    entry[2], entry[3] = cached
+            isNew = entry[2] is None or (isFull and entry[3] is None)
+            if entry[2] is None:
+                entry[2] = contentHash(entry[0], PARTIAL_HASH_BYTES)
+            if isFull and entry[3] is None:
+                entry[3] = entry[2] if entry[1] <= PARTIAL_HASH_BYTES else contentHash(entry[0])
+        except OSError:
+            return None
+        if isNew:
+            self.cache.putHashes(entry[0], *entry[4], entry[2], entry[3])
+        return entry[3] if isFull else entry[2]
+
+    def isDuplicate(self, source, size):
+        # Tells whether source matches a selected file, if not it counts as selected from now on
+        entry = [source, size, None, None, None]
+        group = self.bySize[size]
+        if group:
+            partial = self.hashes(entry, False)
+            for other in group:
+                if partial is None or self.hashes(other, False) != partial:
+                    continue
+                full = self.hashes(entry, True)
+                if full is not None and self.hashes(other, True) == full:
+                    return True
+        group.append(entry)
+        return False
+
+    def remove(self, source, size):
+        group = self.bySize.get(size, [])
+        for index, entry in enumerate(group):
+            if entry[0] == source:
+                del group[index]
+                return
+
+def byteToMbGb(bytesInCurrentFolder):
+    BYTE_TO_MEGABYTE = 9.53674316406 * 10**(-7)
+    BYTE_TO_GIGABYTE = 9.31322575 * 10**(-10)
+    byteInGigabyte = 1073741824
+    if bytesInCurrentFolder < byteInGigabyte - 1:
+        return f'{round(bytesInCurrentFolder * BYTE_TO_MEGABYTE, 2)} MB'
+    else:
+        return f'{round(bytesInCurrentFolder * BYTE_TO_GIGABYTE, 2)} GB'
+
+def describeKeywords(keywords, keywordCount):
+    # Long keyword lists (from keyword files) are cut short in the status
+    if not keywords:
+        return 'None'
+    status = ', '.join(f'"{keyword}"' for keyword in keywords)
+    if keywordCount > len(keywords):
+        status += f' and {keywordCount - len(keywords)} more'
+    return status
+
+def describeExtensions(extensions):
+    if not extensions:
+        return 'None'
+    return ', '.join('.' + extension for extension in extensions)
+
+def formatStatus(run, summary):
+    # The status block shown in the log view, from a run record and its summary record
+    return f'''------------------------------------------------------------------------
+{summary['status']}
+------------------------------------------------------------------------
+Date:\t{summary['date']}
+Time:\t{summary['time']}
+Start:\t{run['root']} 
+Destination:\t{run['dest']}
+Extensions:\t{describeExtensions(run['extensions'])}
+Keywords:\t{describeKeywords(run['keywords'], run['keywordCount'])}
+Total size:\t{byteToMbGb(summary['bytes'])}
+Total runtime:\t{summary['runtime']}s      
+------------------------------------------------------------------------'''
+
+class RunLog:
+    # Append-only log of the runs into one destination folder, one JSON record per line:
+    #   run      root, destination and filters, written when the folder is started
+    #   file     number, source relative to the root and size of every copied file
+    #   summary  status, counts, size and runtime once the folder is done
+    #   index    byte offsets of this run's run and summary records and of the previous index
+    # The index is always the last line, so the latest summary is found from the end of the file
+    # and runs can be followed backwards without reading the files in between.
+    # Writing a run costs one line per copied file and nothing for the runs before it
+    def __init__(self, path):
+        self.path = Path(path)
+        self.isAppend = self.path.exists()
+        self.previousIndex = None
+        if self.isAppend:
+            footer = readFooter(self.path)
+            if footer is not None:
+                self.previousIndex = footer[0]
+        self.file = open(self.path, 'ab')
+        self.runOffset = None
+        self.run = None
+
+    def write(self, record):
+        offset = self.file.tell()
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        return offset
+
+    def start(self, run):
+        self.run = dict({'record': 'run'}, **run)
+        self.runOffset = self.write(self.run)
+
+    def addFile(self, number, source, size):
+        self.write({'record': 'file', 'number': number, 'source': source, 'size': size})
+
+    def finish(self, summary):
+        summaryOffset = self.write(dict({'record': 'summary'}, **summary))
+        self.write({'record': 'index', 'run': self.runOffset, 'summary': summaryOffset, 'previous': self.previousIndex})
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+def readFooter(path):
+    # (offset, record) of the index record that ends the log, None if the last run didn't finish
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        start = end
+        tail = b''
+        while start > 0 and tail.count(b'\n') < 2:
+            start = max(0, start - 4096)
+            f.seek(start)
+            tail = f.read(end - start)
+    lines = tail.rstrip(b'\n').rsplit(b'\n', 1)
+    try:
+        record = json.loads(lines[-1])
+    except ValueError:
+        return None
+    if record.get('record') != 'index':
+        return None
+    return end - len(lines[-1]) - 1, record
+
+def readRecord(f, offset):
+    f.seek(offset)
+    return json.loads(f.readline())
+
+def readLastRun(path):
+    # (run, summary) records of the last finished run, read through the footer index
+    footer = readFooter(path)
+    if footer is None:
+        return None
+    with open(path, 'rb') as f:
+        return readRecord(f, footer[1]['run']), readRecord(f, footer[1]['summary'])
+
+def renderRunLog(path):
+    # The whole log as text, the status of every run followed by its files.
+    # Runs that were cut off before their summary are marked as such
+    blocks = []
+    run = None
+    files = []
+
+    def endRun(summary):
+        if summary is None:
+            summary = {'status': f'INTERRUPTED: {len(files)}/{run.get("requested", "?")} files copied',
+                       'date': run.get('date', ''), 'time': run.get('time', ''),
+                       'bytes': sum(file['size'] for file in files), 'runtime': '?'}
+        blocks.append(formatStatus(run, summary))
+        blocks.extend(f'{file["number"]}: {file["source"]}' for file in files)
+
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            kind = record.get('record')
+            if kind == 'run':
+                if run is not None:
+                    endRun(None)
+                run = record
+                files = []
+            elif kind == 'file' and run is not None:
+                files.append(record)
+            elif kind == 'summary' and run is not None:
+                endRun(record)
+                run = None
+    if run is not None:
+        endRun(None)
+    return '\n'.join(blocks)
+
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1048576, 'GB': 1073741824}
+DURATION_UNITS = {'s': 1, 'm': 60}
+SELECTIONS = ('walk', 'uniform', 'bias', 'stream')
+FILE_NAMES = ('keep', 'index', 'rename')
+COPY_MODES = ('copy', 'hardlink', 'symlink')
+
+def stringToList(string):
+    li = list(string.split(' '))
+    if len(li) == 1 and li[0] == '':
+        return []
+    else:
+        return li
+
+def unescapeIniValue(value):
+    # Undoes the quoting and escapes QSettings uses for strings in IniFormat
+    if value.startswith('@@'):
+        value = value[1:]
+    chars = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '"':
+            i += 1
+            continue
+        if c == '\\' and i + 1 < len(value):
+            escaped = value[i+1]
+            if escaped == 'x':
+                digits = re.match(r'[0-9a-fA-F]{1,4}', value[i+2:])
+                if digits:
+                    chars.append(chr(int(digits.group(), 16)))
+                    i += 2 + len(digits.group())
+                    continue
+            chars.append({'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}.get(escaped, escaped))
+            i += 2
+            continue
+        chars.append(c)
+        i += 1
+    return ''.join(chars)
+
+def readSettingsFile(path):
+    # Widget values of a configuration saved by the window, by widget name
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.optionxform = str
+    if not parser.read(path, encoding='utf-8'):
+        raise OSError(f'Configuration could not be read: {path}')
+    if not parser.has_section('General'):
+        return {}
+    return {name: unescapeIniValue(value) for name, value in parser.items('General')}
+
+class RunOptions:
+    # Settings of one run, the same ones the Setup and Customize tabs hold.
+    # Sizes are in bytes and durations in seconds, a range of None turns that filter off.
+    # randomFiles is a (min, max) file count drawn again for every folder, numberOfFolders
+    # is only used with createFolders
+    DEFAULTS = {
+        'numberOfFiles': 1,
+        'randomFiles': None,
+        'keywords': [],
+        'notKeywords': [],
+        'keywordFile': '',
+        'notKeywordFile': '',
+        'extensions': [],
+        'notExtensions': [],
+        'sizeRange': None,
+        'durationRange': None,
+        'topWeight': 0,
+        'bottomWeight': 0,
+        'selection': 'walk',
+        'favorSize': False,
+        'favorRecent': False,
+        'skipDuplicates': False,
+        'createFolders': False,
+        'numberOfFolders': 1,
+        'nameOfFolders': 'Folder Name',
+        'makeFoldersUnique': True,
+        'parallelFolders': 1,
+        'fileNames': 'keep',
+        'renameName': 'New Name',
+        'trashEmptyFolders': False,
+        'trashSourceFiles': False,
+        'trashInvalidFiles': False,
+        'copyThreads': 4,
+        'copyMode': 'copy',
+        'stallLimit': 10.0,
+        'showInvalid': False,
+    }
+
+    def __init__(self, root, dest, **options):
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError(f'Unknown run options: {", ".join(sorted(unknown))}')
+        self.root = str(root)
+        self.dest = str(dest)
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, options.get(name, default))
+        if self.selection not in SELECTIONS:
+            raise ValueError(f'Selection must be one of {", ".join(SELECTIONS)}, not {self.selection!r}')
+        if self.fileNames not in FILE_NAMES:
+            raise ValueError(f'File names must be one of {", ".join(FILE_NAMES)}, not {self.fileNames!r}')
+        if self.copyMode not in COPY_MODES:
+            raise ValueError(f'Copy mode must be one of {", ".join(COPY_MODES)}, not {self.copyMode!r}')
+        if self.copyMode == 'symlink' and self.trashSourceFiles:
+            raise ValueError('Symlinked files would point at trashed sources, trashSourceFiles needs another copy mode')
+
+    @classmethod
+    def fromSettingsFile(cls, path, **overrides):
+        # Options of a .ini saved by the window. Missing values fall back to the window's defaults
+        values = readSettingsFile(path)
+
+        def isChecked(name, default):
+            value = values.get(name)
+            return default if value is None else value.lower() == 'true'
+
+        def number(name, default, kind=int):
+            try:
+                return kind(values[name])
+            except (KeyError, ValueError):
+                return default
+
+        if 'currentrootCombo' not in values or 'currentdestCombo' not in values:
+            raise ValueError(f'No root or destination folder in {path}')
+
+        options = {'numberOfFiles': number('numFilesCount', 1)}
+
+        # Keyword and extension groups aren't saved by the window, filled in boxes count as on
+        options['keywords'] = stringToList(values.get('incKeysEdit', ''))
+        options['notKeywords'] = stringToList(values.get('excKeysEdit', ''))
+        options['keywordFile'] = values.get('incKeysFileEdit', '')
+        options['notKeywordFile'] = values.get('excKeysFileEdit', '')
+        options['extensions'] = stringToList(values.get('incExtsEdit', ''))
+        options['notExtensions'] = stringToList(values.get('excExtsEdit', ''))
+
+        if isChecked('sizeButton', True):
+            unit = SIZE_UNITS.get(values.get('currentsizeType'), SIZE_UNITS['MB'])
+            options['sizeRange'] = (round(number('sizeLo', 0.0, float) * unit, 2), round(number('sizeHi', 50.0, float) * unit, 2))
+        if isChecked('lengthButton', True):
+            unit = DURATION_UNITS.get(values.get('currentdurationType'), DURATION_UNITS['s'])
+            options['durationRange'] = (number('durationLo', 0.0, float) * unit, number('durationHi', 100.0, float) * unit)
+        if isChecked('weightButton', True):
+            options['topWeight'] = number('topWeightSpinBox', 0)
+            options['bottomWeight'] = number('bottomWeightSpinBox', 0)
+
+        for selection, name in zip(SELECTIONS, ('walkSelectRadio', 'uniformSelectRadio', 'biasSelectRadio', 'streamSelectRadio')):
+            if isChecked(name, False):
+                options['selection'] = selection
+        options['favorSize'] = isChecked('favorSizeCheck', False)
+        options['favorRecent'] = isChecked('favorRecentCheck', False)
+        options['skipDuplicates'] = isChecked('skipDuplicatesCheck', False)
+
+        options['createFolders'] = isChecked('folderButton', True)
+        options['numberOfFolders'] = number('numFoldersCount', 1)
+        options['nameOfFolders'] = values.get('nameOfFoldersEntry', 'Folder Name')
+        options['makeFoldersUnique'] = isChecked('makeFoldersUniqueCheck', True)
+        options['parallelFolders'] = number('parallelFoldersCount', 1)
+
+        if isChecked('fileNameButton', True):
+            if isChecked('indexFilesRadio', False):
+                options['fileNames'] = 'index'
+            elif isChecked('renameFilesRadio', False):
+                options['fileNames'] = 'rename'
+        options['renameName'] = values.get('renameNameEntry', 'New Name')
+
+        if isChecked('trashButton', True):
+            options['trashEmptyFolders'] = isChecked('isTrashEmpty', False)
+            options['trashSourceFiles'] = isChecked('isTrashSource', False)
+            options['trashInvalidFiles'] = isChecked('isTrashInvalid', False)
+
+        options['copyThreads'] = number('copyThreadsSpinBox', 4)
+        if values.get('currentcopyModeCombo') in COPY_MODES:
+            options['copyMode'] = values['currentcopyModeCombo']
+        options['stallLimit'] = number('stallTimeSpinBox', 10.0, float)
+
+        options.update(overrides)
+        root = options.pop('root', values['currentrootCombo'])
+        dest = options.pop('dest', values['currentdestCombo'])
+        return cls(root, dest, **options)
+
+class Callbacks:
+    # Stand-in for a Qt signal, emit calls every connected function on the calling thread
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self.slots:
+            slot(*args)
+
+class RunSignals:
+    # What a run reports while it works, under the names the window's WorkerSignals use:
+    # folderSignal(file count of the new folder), countSignal(files copied), logSignal(list of
+    # lines), timeSignal() when the stall timer restarts and finishedSignal() once the run is over
+    def __init__(self):
+        self.folderSignal = Callbacks()
+        self.countSignal = Callbacks()
+        self.logSignal = Callbacks()
+        self.timeSignal = Callbacks()
+        self.finishedSignal = Callbacks()
+
+def trash(path):
+    # send2trash is only loaded once a run trashes something
+    import send2trash
+    send2trash.send2trash(path)
+
+class BatchedSignals:
+    # Sits between a run and its RunSignals and passes log lines, the file count and stall timer
+    # restarts on from a flush thread every interval seconds, so the receiver's work depends on
+    # the run time instead of the number of files. Each flush emits logSignal once with all new
+    # lines, countSignal with the latest count and timeSignal at most once.
+    # folderSignal and finishedSignal flush first and are passed on right away. Emits hold
+    # emitLock, so a folder never reaches the receiver before the previous folder's last flush
+    INTERVAL = 0.075
+
+    def __init__(self, signals, interval=INTERVAL):
+        self.signals = signals
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.emitLock = threading.RLock()
+        self.lines = []
+        self.count = None
+        self.isTimeReset = False
+        self.isClosed = threading.Event()
+        self.thread = None
+
+        self.logSignal = Callbacks()
+        self.logSignal.connect(self.addLine)
+        self.countSignal = Callbacks()
+        self.countSignal.connect(self.setCount)
+        self.timeSignal = Callbacks()
+        self.timeSignal.connect(self.resetTime)
+        self.folderSignal = Callbacks()
+        self.folderSignal.connect(self.passFolder)
+        self.finishedSignal = Callbacks()
+        self.finishedSignal.connect(self.passFinished)
+
+    def start(self):
+        self.isClosed.clear()
+        self.thread = threading.Thread(target=self.flushLoop, daemon=True)
+        self.thread.start()
+
+    def flushLoop(self):
+        while not self.isClosed.wait(self.interval):
+            self.flush()
+
+    def addLine(self, line):
+        with self.lock:
+            self.lines.append(line)
+
+    def setCount(self, count):
+        with self.lock:
+            self.count = count
+
+    def resetTime(self):
+        with self.lock:
+            self.isTimeReset = True
+
+    def flush(self):
+        with self.emitLock:
+            with self.lock:
+                lines, self.lines = self.lines, []
+                count, self.count = self.count, None
+                isTimeReset, self.isTimeReset = self.isTimeReset, False
+            if lines:
+                self.signals.logSignal.emit(lines)
+            if count is not None:
+                self.signals.countSignal.emit(count)
+            if isTimeReset:
+                self.signals.timeSignal.emit()
+
+    def passFolder(self, numberOfFiles):
+        with self.emitLock:
+            self.flush()
+            self.signals.folderSignal.emit(numberOfFiles)
+
+    def passFinished(self):
+        self.isClosed.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        self.signals.finishedSignal.emit()
+
+def loadNumpy():
+    # NumPy is optional, without it the file catalog isn't used
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class FileCatalog:
+    # Every file under one root as NumPy columns: name (a list), parent folder ID, size, mtime,
+    # extension code and duration, NaN while unknown. The rows are also kept sorted by size, so
+    # a size range is found by binary search and the Extensions and Length filters are boolean
+    # masks over the files in it. Built from the root's DirectoryIndex and only
+    # rebuilt when a listing in it changed, so a filter change needs no walk of the tree.
+    # Folders also keep the log of the chance that the random walk lands in them, for folder bias.
+    # Sizes and mtimes are only filled in (isSized) when a run with the Size or Length filter asks
+    def __init__(self, np, root):
+        self.np = np
+        self.root = root
+        self.sources = {}
+        self.isSized = False
+        self.clear()
+
+    def clear(self):
+        np = self.np
+        self.folders = []
+        self.folderIds = {}
+        self.folderStarts = []
+        self.folderLogWeights = np.zeros(0)
+        self.nameOffsets = {}
+        self.names = []
+        self.parents = np.zeros(0, dtype=np.int32)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self.mtimes = np.zeros(0, dtype=np.int64)
+        self.extensionIds = {}
+        self.extensionCodes = np.zeros(0, dtype=np.int32)
+        self.durations = np.zeros(0)
+        self.sizeOrder = np.zeros(0, dtype=np.int64)
+        self.sortedSizes = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def refresh(self, directoryIndex, onEmpty=None, isStatFiles=False):
+        # Checks every folder against the index and rebuilds the columns if any listing changed.
+        # sources maps each folder to the names list it was read from and its subfolders
+        sources = {}
+        isChanged = isStatFiles and not self.isSized
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                names, sizes, mtimes = directoryIndex.scandir(folder, isStatFiles)
+            except OSError:
+                isChanged = True
+                continue
+            if not names and onEmpty is not None and folder != self.root:
+                onEmpty(folder)
+            source = self.sources.get(folder)
+            if source is None or source[0] is not names:
+                isChanged = True
+                source = (names, [os.path.join(folder, name) for name, size in zip(names, sizes) if size < 0])
+            sources[folder] = source
+            stack.extend(source[1])
+        if isChanged or sources.keys() != self.sources.keys():
+            self.sources = sources
+            self.build(directoryIndex, isStatFiles)
+
+    def build(self, directoryIndex, isStatFiles=False):
+        np = self.np
+        self.clear()
+        parents = []
+        sizes = []
+        mtimes = []
+        codes = []
+        logWeights = []
+        stack = [(self.root, 0.0)]
+        while stack:
+            folder, logWeight = stack.pop()
+            try:
+                names, folderSizes, folderMtimes = directoryIndex.scandir(folder, isStatFiles)
+            except OSError:
+                continue
+            if not names:
+                continue
+            logWeight -= math.log(len(names))
+            folderId = len(self.folders)
+            self.folderIds[folder] = folderId
+            self.folders.append(folder)
+            self.folderStarts.append(len(self.names))
+            logWeights.append(logWeight)
+            for name, size, mtime in zip(names, folderSizes, folderMtimes):
+                if size < 0:
+                    stack.append((os.path.join(folder, name), logWeight))
+                    continue
+                extension = os.path.splitext(name)[1][1:].lower()
+                self.names.append(name)
+                parents.append(folderId)
+                sizes.append(size)
+                mtimes.append(mtime)
+                codes.append(self.extensionIds.setdefault(extension, len(self.extensionIds)))
+        self.folderStarts.append(len(self.names))
+        self.folderLogWeights = np.array(logWeights, dtype=np.float64)
+        self.parents = np.array(parents, dtype=np.int32)
+        self.sizes = np.array(sizes, dtype=np.int64)
+        self.mtimes = np.array(mtimes, dtype=np.int64)
+        self.extensionCodes = np.array(codes, dtype=np.int32)
+        self.durations = np.full(len(self.names), np.nan)
+        self.sizeOrder = np.argsort(self.sizes, kind='stable')
+        self.sortedSizes = self.sizes[self.sizeOrder]
+        self.isSized = isStatFiles
+
+    def indexOf(self, path):
+        # Row of a file by absolute path, None if it isn't in the catalog
+        folderId = self.folderIds.get(os.path.dirname(path))
+        if folderId is None:
+            return None
+        if folderId not in self.nameOffsets:
+            start, end = self.folderStarts[folderId], self.folderStarts[folderId+1]
+            self.nameOffsets[folderId] = {self.names[i]: i for i in range(start, end)}
+        return self.nameOffsets[folderId].get(os.path.basename(path))
+
+    def loadDurations(self, cache):
+        # Fills in the durations the metadata cache holds for unchanged files
+        for path, size, mtime, duration in cache.durationsUnder(self.root):
+            i = self.indexOf(path)
+            if i is not None and self.sizes[i] == size and self.mtimes[i] == mtime:
+                self.durations[i] = self.np.nan if duration is None else duration
+
+    def extensionMask(self, extensions, rows):
+        codes = [self.extensionIds[e] for e in map(FileFilter.normalizeExtension, extensions) if e in self.extensionIds]
+        return self.np.isin(self.extensionCodes[rows], codes)
+
+    def sizeSpan(self, sizeRange):
+        # Positions in sortedSizes of the files in [min, max]
+        start = int(self.np.searchsorted(self.sortedSizes, sizeRange[0], side='left'))
+        end = int(self.np.searchsorted(self.sortedSizes, sizeRange[1], side='right'))
+        return start, max(start, end)
+
+    def countSize(self, sizeRange):
+        start, end = self.sizeSpan(sizeRange)
+        return end - start
+
+    def candidates(self, sizeRange=None, extensions=(), notExtensions=(), durationRange=None):
+        # Rows of the files that pass the filters, in no particular order. Unknown durations
+        # pass, they are probed when drawn
+        np = self.np
+        if sizeRange is None:
+            rows = np.arange(len(self.names))
+        else:
+            start, end = self.sizeSpan(sizeRange)
+            rows = self.sizeOrder[start:end]
+        keep = np.ones(len(rows), dtype=bool)
+        if extensions:
+            keep &= self.extensionMask(extensions, rows)
+        if notExtensions:
+            keep &= ~self.extensionMask(notExtensions, rows)
+        if durationRange is not None:
+            durations = self.durations[rows]
+            with np.errstate(invalid='ignore'):
+                keep &= np.isnan(durations) | ((durations >= durationRange[0]) & (durations <= durationRange[1]))
+        return rows[keep]
+
+    def logWeights(self, indices):
+        return self.folderLogWeights[self.parents[indices]].tolist()
+
+    def file(self, i):
+        return os.path.join(self.folders[self.parents[i]], self.names[i]), int(self.sizes[i]), int(self.mtimes[i])
+
+fileCatalogs = {}
+
+def getFileCatalog(root):
+    # One catalog per root, kept in memory for the session. None without NumPy
+    if root not in fileCatalogs:
+        np = loadNumpy()
+        fileCatalogs[root] = None if np is None else FileCatalog(np, root)
+    return fileCatalogs[root]
+
+def countSizeMatches(root, sizeRange):
+    # Files under root in the size range, from a catalog that is already in memory. None if
+    # no run built one for the root yet, so asking never walks the tree
+    catalog = fileCatalogs.get(os.path.abspath(root))
+    if catalog is None or not catalog.sources or (sizeRange is not None and not catalog.isSized):
+        return None
+    if sizeRange is None:
+        return len(catalog)
+    return catalog.countSize(sizeRange)
+
+directoryIndexes = {}
+
+def getDirectoryIndex(root):
+    # One index per root, kept in memory for the session and on disk between sessions
+    if root not in directoryIndexes:
+        directoryIndexes[root] = DirectoryIndex(root)
+    return directoryIndexes[root]
+
+
+class Mandala:
+    # One run: copies random files from options.root into options.dest, folder by folder.
+    # run() blocks until the run is done, stop() may be called from another thread
+    def __init__(self, options, signals=None, interval=BatchedSignals.INTERVAL):
+        self.options = options
+        self.signals = BatchedSignals(signals if signals is not None else RunSignals(), interval)
+        self.stopTracker = False
+        self.openFolders = []
+
+    def stop(self):
+        self.stopTracker = True
+
+    def assignGlobalVariables(self):
+        options = self.options
+        self.folderAllocator = None
+        self.openFolders = []
+
+        # File Count Variables
+        self.isRandFiles = options.randomFiles is not None
+        self.numberOfFiles = options.numberOfFiles
+
+        # Root and Destination
+        self.root = Path(options.root)
+
+        # Keyword Variables
+        self.keywords = list(options.keywords) + self.loadKeywordFile(options.keywordFile)
+        self.notKeywords = list(options.notKeywords) + self.loadKeywordFile(options.notKeywordFile)
+
+        # Extension Variables
+        self.extensions = list(options.extensions)
+        self.notExtensions = list(options.notExtensions)
+
+        # File Size Variables
+        self.isRemoveSizeLimit = options.sizeRange is None
+        if not self.isRemoveSizeLimit:
+            self.minSize, self.maxSize = options.sizeRange
+
+        # File Length Variables
+        self.isRemoveLengthLimit = options.durationRange is None
+        if not self.isRemoveLengthLimit:
+            self.minDuration, self.maxDuration = options.durationRange
+
+        # Weight Variables
+        self.topWeightValue = options.topWeight
+        self.bottomWeightValue = options.bottomWeight
+
+        # Selection Variables
+        self.isWalkSelection = options.selection == 'walk'
+        self.isStreamSelection = options.selection == 'stream'
+        self.isSamplerSelection = not (self.isWalkSelection or self.isStreamSelection)
+        self.isFolderBias = options.selection == 'bias'
+        # Drawn selections leave saturated folders out of the draws, the walk prunes them like used ones
+        self.isQuota = self.isSamplerSelection and (self.topWeightValue > 0 or self.bottomWeightValue > 0)
+        self.quotaTops = {}
+        self.quotaLeaves = {}
+        self.isFavorSize = self.isStreamSelection and options.favorSize
+        self.isFavorRecent = self.isStreamSelection and options.favorRecent
+        self.streamedFiles = set()
+        self.streamPasses = 0
+
+        # Folder Variables
+        self.makeFoldersUnique = options.makeFoldersUnique
+        self.nameOfFolders = options.nameOfFolders
+        self.isCreateFolders = options.createFolders
+
+        # Folder Count. Without Make Unique every folder needs a search of its own, so only
+        # unique folders are filled several at once
+        if self.isCreateFolders:
+            self.numFolders = options.numberOfFolders
+        else:
+            self.numFolders = 1
+        if self.makeFoldersUnique:
+            self.parallelFolders = max(1, min(options.parallelFolders, self.numFolders))
+        else:
+            self.parallelFolders = 1
+        self.isParallel = self.parallelFolders > 1
+
+        # Filename Variables
+        self.indexFiles = options.fileNames == 'index'
+        self.renameFiles = options.fileNames == 'rename'
+        self.renameName = options.renameName if self.renameFiles else ''
+
+        # Trash Variables
+        self.trashEmptyFolders = options.trashEmptyFolders
+        self.trashSourceFiles = options.trashSourceFiles
+        self.trashInvalidFiles = options.trashInvalidFiles
+
+        self.isShowInvalid = options.showInvalid
+        self.stallLimit = options.stallLimit
+        self.copyPool = CopyPool(options.copyThreads)
+        self.copier = FileCopier(options.copyMode)
+        if self.isRemoveLengthLimit and not options.skipDuplicates:
+            self.metadataCache = None
+        else:
+            self.metadataCache = MetadataCache()
+        if self.isRemoveLengthLimit:
+            self.prober = None
+            self.lookaheadSize = 1
+        else:
+            workers = os.cpu_count() or 1
+            self.prober = DurationProber(workers, self.metadataCache)
+            self.lookaheadSize = 4 * workers
+        self.sourceDuplicates = SourceDuplicates(self.metadataCache) if options.skipDuplicates else None
+        self.fileFilter = FileFilter(self.keywords, self.notKeywords, self.extensions, self.notExtensions,
+            None if self.isRemoveSizeLimit else (self.minSize, self.maxSize),
+            None if self.isRemoveLengthLimit else (self.minDuration, self.maxDuration),
+            self.prober)
+        self.startAbsolute = os.path.abspath(self.root)
+        self.directoryIndex = getDirectoryIndex(self.startAbsolute)
+        self.directoryIndex.startRun()
+        self.touched = TouchedTree(self.startAbsolute, self.directoryIndex.scandir)
+        # Files filtered out before the draw are never looked at, so runs that trash or list
+        # invalid files check every file themselves
+        self.isPrefiltered = not (self.trashInvalidFiles or self.isShowInvalid)
+        if self.isSamplerSelection and self.isPrefiltered:
+            self.catalog = getFileCatalog(self.startAbsolute)
+        else:
+            self.catalog = None
+        self.progress = 0
+        self.startStallTime = perf_counter()
+
+    def run(self):
+        self.signals.start()
+        self.assignGlobalVariables()
+        if self.isSamplerSelection:
+            self.sampler = self.buildSampler()
+            if self.isPrefiltered:
+                self.signals.logSignal.emit(f'{len(self.sampler)} files match')
+
+        # File counts of the folders still to open
+        if self.isRandFiles:
+            self.folderSizes = [random.randint(*sorted(self.options.randomFiles)) for _ in range(self.numFolders)]
+        else:
+            self.folderSizes = [self.numberOfFiles] * self.numFolders
+        self.folderSizes.reverse()
+        if self.isParallel:
+            self.signals.folderSignal.emit(sum(self.folderSizes))
+
+        while self.folderSizes and not self.stopTracker:
+            # If you don't want unique folders, clear the touched state and restart
+            if self.makeFoldersUnique:
+                self.touched.untouch(TouchedTree.ROOT, TouchedTree.SEARCHED)
+            else:
+                self.touched.reset()
+                self.streamedFiles = set()
+                self.streamPasses = 0
+                if self.sourceDuplicates is not None:
+                    self.sourceDuplicates.reset()
+                if self.isSamplerSelection:
+                    self.sampler.reset()
+
+            self.openNextFolders()
+            if self.isWalkSelection:
+                isFinished = self.fillFolders(self.walkCandidates(), self.untouchFiles)
+            elif self.isStreamSelection:
+                isFinished = self.fillFoldersByStream()
+            else:
+                isFinished = self.fillFolders(self.samplerCandidates(), self.putBackCandidates)
+            if not isFinished:
+                break
+
+            ##################################################   END OF FOLDER  ##################################################           
+            # Folders still open ran out of files, terminates the program if one got none
+            for folder in list(self.openFolders):
+                if not self.finishFolder(folder):
+                    self.folderSizes = []
+
+        self.stopMandala()
+
+    def openNextFolders(self):
+        # Returns True if a folder was opened
+        isOpened = False
+        while len(self.openFolders) < self.parallelFolders and self.folderSizes:
+            self.openFolder()
+            isOpened = True
+        return isOpened
+
+    def openFolder(self):
+        # Starts the next destination folder and its log
+        target = Path(self.options.dest)
+        if self.isCreateFolders:
+            # The destination is only listed for the run's first folder
+            if self.folderAllocator is None:
+                self.folderAllocator = FolderAllocator(target, self.nameOfFolders)
+            target = self.folderAllocator.make()
+        folder = OutputFolder(target, self.folderSizes.pop())
+        folder.log.start(self.runRecord(folder))
+        self.openFolders.append(folder)
+        if self.isQuota:
+            self.refreshQuotas()
+        self.startStallTime = perf_counter()
+        if not self.isParallel:
+            self.progress = 0
+            self.signals.folderSignal.emit(folder.numberOfFiles)
+        return folder
+
+    def finishFolder(self, folder):
+        # Closes a folder that got all its files or ran out of them. Returns False if it got
+        # none, which ends the run
+        self.closeFolderLog(folder)
+        if folder.count == 0 and self.isCreateFolders:
+            shutil.rmtree(folder.path)
+            return False
+        elif folder.count == 0 and not self.isCreateFolders and not folder.log.isAppend:
+            os.remove(folder.log.path)
+        return True
+
+    def closeFolderLog(self, folder):
+        self.openFolders.remove(folder)
+        self.signals.logSignal.emit(self.writeStatusLog(folder))
+        if self.isQuota:
+            self.refreshQuotas()
+        # Folders only sit out for this folder's weights
+        elif not self.isParallel:
+            for node in folder.weighted.keys():
+                if node is not None:
+                    self.touched.untouch(node, TouchedTree.WEIGHT)
+
+    def stopMandala(self):
+        self.copyPool.shutdown()
+        if self.prober is not None:
+            self.prober.shutdown()
+        if self.metadataCache is not None:
+            self.metadataCache.close()
+        # Folders cut short by Stop still get their status
+        for folder in list(self.openFolders):
+            self.closeFolderLog(folder)
+        self.directoryIndex.save()
+        self.signals.finishedSignal.emit()
+
+
+    def fillFolders(self, candidates, putBack):
+        # Validates candidates and copies them until the open folders are full. While the Length
+        # filter is on, the durations of the next few candidates are probed ahead in worker processes.
+        # Skipped and unused candidates are handed to putBack. Returns False if the run was stopped
+        lookahead = collections.deque()
+        skipped = []
+        isExhausted = False
+        while not self.stopTracker:
+            # With parallel folders the next ones take the place of those that are full, files
+            # skipped for their weights get another try in them
+            if self.isParallel and self.openNextFolders():
+                lookahead.extendleft(reversed(skipped))
+                skipped = []
+            if not self.openFolders:
+                break
+            if all(folder.isFull() for folder in self.openFolders):
+                # Finishing a copy may close its folder
+                if not len(self.copyPool):
+                    break
+                self.copyPool.finishOldest()
+                continue
+
+            while not isExhausted and len(lookahead) < self.lookaheadSize:
+                candidate = next(candidates, None)
+                if candidate is None:
+                    isExhausted = True
+                    continue
+                # The index only notices changes to a folder, a file rewritten in place keeps its
+                # old size and mtime there. Every candidate is checked on disk once, before the
+                # size filter and the duration cache see it
+                sourceAbsolute, size, mtime, topNode, parentNode = candidate
+                try:
+                    stat = os.stat(sourceAbsolute)
+                except OSError:
+                    continue
+                candidate = (sourceAbsolute, stat.st_size, stat.st_mtime_ns, topNode, parentNode)
+                if self.fileFilter.isValidNameAndSize(os.path.basename(sourceAbsolute), stat.st_size):
+                    if self.prober is not None:
+                        self.prober.prefetch(sourceAbsolute, candidate[1:3])
+                    lookahead.append(candidate)
+                else:
+                    self.recordInvalidFile(sourceAbsolute)
+            if not lookahead:
+                break
+
+            sourceAbsolute, size, mtime, topNode, parentNode = lookahead.popleft()
+            # Folders that reached their weight sit out until the next destination folder
+            folder = self.folderFor(topNode, parentNode)
+            if folder is None:
+                skipped.append((sourceAbsolute, size, mtime, topNode, parentNode))
+                continue
+            if self.fileFilter.isValidDuration(sourceAbsolute, (size, mtime)):
+                self.copyFilesToTarget(folder, Path(sourceAbsolute), size, topNode, parentNode)
+            else:
+                self.recordInvalidFile(sourceAbsolute)
+        self.copyPool.drain()
+        # Putting skipped files back reopens the tree, the status still has to tell it was searched
+        if isExhausted and not lookahead and self.touched.isTouched(TouchedTree.ROOT):
+            self.touched.touch(TouchedTree.ROOT, TouchedTree.SEARCHED)
+
+        unused = [candidate[0] for candidate in lookahead]
+        if self.prober is not None:
+            self.prober.cancel(unused)
+        putBack([candidate[0] for candidate in skipped] + unused)
+        return not self.stopTracker
+
+    def walkCandidates(self):
+        # Random walk from the root on absolute paths, file and folder types come from the directory index.
+        # Yields (sourceAbsolute, size, mtime, topNode, parentNode) for every untouched file it lands on,
+        # until the root is exhausted or the search is over. topNode is the folder directly under the
+        # root the file is in, None for files in the root itself
+        self.walkedFiles = {}
+        while not self.isSearchOver():
+            # Every walk starts at the root
+            node = TouchedTree.ROOT
+            mainPathAbsolute = self.startAbsolute
+            topNode = None
+            while True:
+                try:
+                    names, sizes, mtimes = self.touched.listing(node, mainPathAbsolute)
+                except OSError:
+                    break
+                # If folder is empty
+                if len(names) == 0:
+                    if self.trashEmptyFolders: trash(mainPathAbsolute)
+                    break
+
+                # Chooses random path, used up folders are already marked up to the root
+                randomIndex = random.randrange(len(names))
+                randomNode = self.touched.childOf(node, randomIndex)
+                if self.touched.isTouched(randomNode):
+                    break
+                randomPathAbsolute = os.path.join(mainPathAbsolute, names[randomIndex])
+                # If random path is file:
+                if sizes[randomIndex] >= 0:
+                    self.touched.touch(randomNode)
+                    self.walkedFiles[randomPathAbsolute] = randomNode
+                    yield randomPathAbsolute, sizes[randomIndex], mtimes[randomIndex], topNode, node
+                    break
+                # If random path is folder
+                if node == TouchedTree.ROOT:
+                    topNode = randomNode
+                node = randomNode
+                mainPathAbsolute = randomPathAbsolute
+
+    def untouchFiles(self, paths):
+        # Lets the walk land on files again that were picked but never used
+        for path in paths:
+            self.touched.untouch(self.walkedFiles.pop(path))
+
+    def samplerCandidates(self):
+        # Draws from the prebuilt candidate list until it is empty or the search is over
+        while not self.isSearchOver():
+            i = self.sampler.draw()
+            if i is None:
+                self.touched.touch(TouchedTree.ROOT, TouchedTree.SEARCHED)
+                return
+            candidate, size, mtime = self.candidateAt(i)
+            self.drawnCandidates[candidate] = i
+            top = self.topFolderOf(candidate)
+            parent = os.path.dirname(candidate)
+            topNode = self.touched.folderId(top) if top else None
+            parentNode = self.touched.folderId(parent)
+            if self.isQuota:
+                self.quotaTops[topNode] = top
+                self.quotaLeaves[parentNode] = parent
+            yield candidate, size, mtime, topNode, parentNode
+
+    def candidateAt(self, i):
+        if self.catalog is not None:
+            return self.catalog.file(self.candidateIndices[i])
+        return self.candidatePaths[i], self.candidateSizes[i], self.candidateMtimes[i]
+
+    def putBackCandidates(self, paths):
+        self.sampler.putBack([self.drawnCandidates.pop(path) for path in paths])
+
+    def fillFoldersByStream(self):
+        # Fills the open folders from bounded reservoir passes over the tree, returns False if the run was stopped
+        while not self.stopTracker:
+            if self.isParallel:
+                self.openNextFolders()
+            if not self.openFolders:
+                break
+            picks = self.streamReservoir(sum(folder.numberOfFiles - folder.count for folder in self.openFolders))
+            if picks is None:
+                return False
+            if not picks:
+                self.touched.touch(TouchedTree.ROOT, TouchedTree.SEARCHED)
+                break
+
+            for sourceAbsolute, size in picks:
+                if self.stopTracker:
+                    break
+                topNode = self.topNodeOf(sourceAbsolute)
+                parentNode = self.touched.folderId(os.path.dirname(sourceAbsolute))
+                folder = self.folderFor(topNode, parentNode)
+                if folder is None:
+                    continue
+                self.streamedFiles.add(sourceAbsolute)
+                self.copyFilesToTarget(folder, Path(sourceAbsolute), size, topNode, parentNode)
+            self.copyPool.drain()
+        return not self.stopTracker
+
+    def streamReservoir(self, k):
+        # One scandir pass that keeps the k files with the largest keys log(u)/weight (A-Res).
+        # Size and name filters run inline, the duration probe only for files that would
+        # enter the reservoir, so memory and probing stay bounded by k instead of the tree size.
+        # Returns [(path, size)] best key first, or None if the run was stopped. Invalid files are
+        # recorded like in the other selections, on the first pass only so they needn't be kept
+        reservoir = []
+        self.streamNow = time()
+        stack = [self.startAbsolute]
+        while stack:
+            if self.stopTracker:
+                return None
+            folder = stack.pop()
+            try:
+                it = os.scandir(folder)
+            except OSError:
+                continue
+            isEmpty = True
+            with it:
+                for entry in it:
+                    isEmpty = False
+                    try:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file() or entry.path in self.streamedFiles:
+                            continue
+                        if not self.fileFilter.isValidName(entry.name):
+                            self.rejectStreamedFile(entry.path)
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if not self.fileFilter.isValidSize(stat.st_size):
+                        self.rejectStreamedFile(entry.path)
+                        continue
+                    if self.isWeightSaturatedPath(entry.path):
+                        continue
+                    key = math.log(random.random() or sys.float_info.min) / self.streamWeight(stat)
+                    if len(reservoir) == k and key <= reservoir[0][0]:
+                        continue
+                    if not self.fileFilter.isValidDuration(entry.path, (stat.st_size, stat.st_mtime_ns)):
+                        self.rejectStreamedFile(entry.path)
+                        continue
+                    if len(reservoir) < k:
+                        heapq.heappush(reservoir, (key, entry.path, stat.st_size))
+                    else:
+                        heapq.heapreplace(reservoir, (key, entry.path, stat.st_size))
+            if isEmpty and self.trashEmptyFolders and folder != self.startAbsolute:
+                trash(folder)
+        self.streamPasses += 1
+        reservoir.sort(reverse=True)
+        return [(path, size) for key, path, size in reservoir]
+
+    def rejectStreamedFile(self, pathAbsolute):
+        if self.streamPasses == 0:
+            self.recordInvalidFile(pathAbsolute)
+
+    def streamWeight(self, stat):
+        weight = 1.0
+        if self.isFavorSize:
+            weight *= stat.st_size + 1
+        if self.isFavorRecent:
+            weight /= 1 + max(0, self.streamNow - stat.st_mtime) / 86400
+        return weight
+
+    def isWeightSaturated(self, folder, topNode, parentNode):
+        # True if the file's top or bottom folder already reached its weight in the destination folder
+        if self.topWeightValue > 0 and folder.weighted.get(topNode, 0) >= self.topWeightValue:
+            return True
+        if self.bottomWeightValue > 0 and folder.weighted.get(parentNode, 0) >= self.bottomWeightValue:
+            return True
+        return False
+
+    def folderFor(self, topNode, parentNode):
+        # The first opened folder that still has room for the file, None if there is none. Folders
+        # are filled in order like one at a time, so a source that runs short leaves one folder
+        # partial instead of all of them
+        for folder in self.openFolders:
+            if not (folder.isFull() or self.isWeightSaturated(folder, topNode, parentNode)):
+                return folder
+        return None
+
+    def isWeightSaturatedPath(self, pathAbsolute):
+        # Same check by path, for every open folder. Folders that have no ID yet never had a file
+        # copied, so they aren't listed for it
+        top = self.topFolderOf(pathAbsolute)
+        topNode = self.touched.folderIds.get(top, -1) if top else None
+        parentNode = self.touched.folderIds.get(os.path.dirname(pathAbsolute), -1)
+        return all(self.isWeightSaturated(folder, topNode, parentNode) for folder in self.openFolders)
+
+    def isSearchOver(self):
+        return self.stopTracker or self.touched.isTouched(TouchedTree.ROOT) or self.isTimedOut(self.startStallTime)
+
+    def copyFilesToTarget(self, folder, source, size, topNode, parentNode):
+        # Picks the target name here, on the selection thread, and hands the copy to the pool.
+        # The file counts towards its weights right away so the selection never overshoots them
+        fileNum = folder.count + folder.inFlight
+        if self.sourceDuplicates is not None and self.sourceDuplicates.isDuplicate(str(source), size):
+            self.recordInvalidFile(str(source))
+            return
+        names = self.targetNamesFor(folder, fileNum, source, size)
+        if names is None:
+            self.recordInvalidFile(str(source))
+            return
+        target = self.allocateTarget(folder, names, str(source), size)
+        folder.inFlight += 1
+        self.countWeight(folder, topNode, parentNode, 1)
+        self.copyPool.submit(self.copyFile, (folder, str(source), target, names, size),
+            lambda result: self.finishCopy(folder, *result, str(source), size, topNode, parentNode))
+
+    def finishCopy(self, folder, error, target, sourceAbsolute, size, topNode, parentNode):
+        # Called in submission order once a copy is done. A folder is closed as soon as it's full
+        folder.inFlight -= 1
+        if error is None:
+            folder.index.landed(target.name)
+            self.recordValidFile(folder, sourceAbsolute, size)
+            if folder.count == folder.numberOfFiles:
+                self.closeFolderLog(folder)
+        else:
+            folder.index.remove(target.name)
+            if self.sourceDuplicates is not None:
+                self.sourceDuplicates.remove(sourceAbsolute, size)
+            self.countWeight(folder, topNode, parentNode, -1)
+            self.recordFailedCopy(sourceAbsolute, error)
+
+    def countWeight(self, folder, topNode, parentNode, step):
+        # Adds (step=1) or removes (step=-1) a file from its top and bottom folder weights.
+        # Drawn selections block saturated folders in the sampler. For the walk they are touched
+        # so it leaves them out, files in the root itself share the top weight but have no folder
+        # to touch. With parallel folders a source folder saturated in one destination may still
+        # fit another, so nothing is touched
+        for node, limit, isTop in ((topNode, self.topWeightValue, True), (parentNode, self.bottomWeightValue, False)):
+            if limit <= 0:
+                continue
+            folder.weighted[node] += step
+            if self.isQuota:
+                self.updateQuota(node, limit, isTop)
+                continue
+            if node is None or self.isParallel:
+                continue
+            if step > 0 and folder.weighted[node] == limit:
+                self.touched.touch(node, TouchedTree.WEIGHT)
+            elif step < 0 and folder.weighted[node] == limit - 1:
+                self.touched.untouch(node, TouchedTree.WEIGHT)
+
+    def updateQuota(self, node, limit, isTop):
+        # A folder drops out of the draws while it's saturated in every open folder
+        isFull = bool(self.openFolders) and all(folder.weighted.get(node, 0) >= limit for folder in self.openFolders)
+        self.sampler.setBlocked((self.quotaTops if isTop else self.quotaLeaves)[node], isTop, isFull)
+
+    def refreshQuotas(self):
+        # The open folders changed. Only folders counted in all of them can still be saturated
+        self.sampler.unblockAll()
+        if not self.openFolders:
+            return
+        for node in list(self.openFolders[0].weighted):
+            if self.topWeightValue > 0 and node in self.quotaTops:
+                self.updateQuota(node, self.topWeightValue, True)
+            if self.bottomWeightValue > 0 and node in self.quotaLeaves:
+                self.updateQuota(node, self.bottomWeightValue, False)
+
+    def recordValidFile(self, folder, sourceAbsolute, size):
+        sourceRelative = os.path.relpath(sourceAbsolute, self.root)
+        folder.log.addFile(folder.count+1, sourceRelative, size)
+        if self.isParallel:
+            self.signals.logSignal.emit(f'[{folder.path.name}] {folder.count+1}: {sourceRelative}')
+        else:
+            self.signals.logSignal.emit(f'{folder.count+1}: {sourceRelative}')
+
+        folder.bytes += size
+        folder.count += 1
+        self.progress += 1
+        self.signals.countSignal.emit(self.progress)
+        self.startStallTime = perf_counter()
+        self.signals.timeSignal.emit()
+
+        if self.trashSourceFiles: 
+            trash(str(sourceAbsolute))
+
+    def recordFailedCopy(self, sourceAbsolute, error):
+        # A file that couldn't be copied isn't invalid, it's always listed and never trashed
+        sourceRelative = os.path.relpath(sourceAbsolute, self.root)
+        self.signals.logSignal.emit(f'!!: {sourceRelative} ({error.strerror or error})')
+
+    def recordInvalidFile(self, sourceAbsolute):
+        sourceRelative = os.path.relpath(sourceAbsolute, self.root)
+        if self.isShowInvalid and self.progress < 100:
+            self.signals.logSignal.emit(f'**: {sourceRelative}')
+        elif self.isShowInvalid and self.progress >= 100:
+            self.signals.logSignal.emit(f'***: {sourceRelative}')
+        elif self.isShowInvalid and self.progress >= 1000:
+            self.signals.logSignal.emit(f'****: {sourceRelative}')
+        
+        if self.trashInvalidFiles: 
+            trash(str(sourceAbsolute))
+
+    def topFolderOf(self, pathAbsolute):
+        # Folder directly under the root that contains the path, '' for files in the root itself
+        relative = os.path.relpath(pathAbsolute, self.startAbsolute)
+        top = relative.split(os.sep, 1)[0]
+        if top == relative:
+            return ''
+        return os.path.join(self.startAbsolute, top)
+
+    def quotaTopOf(self, folderAbsolute):
+        # Top folder the files of a folder count towards, '' for the root itself
+        if folderAbsolute == self.startAbsolute:
+            return ''
+        return os.path.join(self.startAbsolute, os.path.relpath(folderAbsolute, self.startAbsolute).split(os.sep, 1)[0])
+
+    def topNodeOf(self, pathAbsolute):
+        top = self.topFolderOf(pathAbsolute)
+        return self.touched.folderId(top) if top else None
+
+    def buildSampler(self):
+        # Flattens the indexed tree into one list of files and their sizes. For folder bias every
+        # file also gets the log of the chance that the random walk lands on it. Files whose
+        # name or size fail the filters are left out, so they never cost a draw
+        if self.catalog is not None:
+            return self.buildCatalogSampler()
+        self.candidatePaths = []
+        self.candidateSizes = []
+        self.candidateMtimes = []
+        self.drawnCandidates = {}
+        logWeights = []
+        leaves = []
+        # Files are only statted up front when their size can leave them out
+        isStatFiles = self.isPrefiltered and not self.isRemoveSizeLimit
+        stack = [(self.startAbsolute, 0.0)]
+        while stack:
+            folder, logWeight = stack.pop()
+            try:
+                names, sizes, mtimes = self.directoryIndex.scandir(folder, isStatFiles)
+            except OSError:
+                continue
+            if not names:
+                if self.trashEmptyFolders and folder != self.startAbsolute:
+                    trash(folder)
+                continue
+            logWeight -= math.log(len(names))
+            for name, size, mtime in zip(names, sizes, mtimes):
+                path = os.path.join(folder, name)
+                if size < 0:
+                    stack.append((path, logWeight))
+                elif not self.isPrefiltered or self.fileFilter.isValidNameAndSize(name, size):
+                    self.candidatePaths.append(path)
+                    self.candidateSizes.append(size)
+                    self.candidateMtimes.append(mtime)
+                    logWeights.append(logWeight)
+                    leaves.append(folder)
+        if self.isQuota:
+            return QuotaSampler(leaves, self.quotaTopOf, logWeights if self.isFolderBias else None)
+        if self.isFolderBias:
+            return CandidateSampler(len(self.candidatePaths), logWeights)
+        return CandidateSampler(len(self.candidatePaths))
+
+    def buildCatalogSampler(self):
+        # Same candidates from the catalog. The size range is looked up in the size index, the
+        # Extensions and Length filters run on the files in it at once and keywords on what's left
+        catalog = self.catalog
+        catalog.refresh(self.directoryIndex, trash if self.trashEmptyFolders else None,
+            not (self.isRemoveSizeLimit and self.isRemoveLengthLimit))
+        if not self.isRemoveLengthLimit:
+            catalog.loadDurations(self.metadataCache)
+        rows = catalog.candidates(None if self.isRemoveSizeLimit else (self.minSize, self.maxSize),
+            self.extensions, self.notExtensions,
+            None if self.isRemoveLengthLimit else (self.minDuration, self.maxDuration))
+        if self.keywords or self.notKeywords:
+            rows = rows[[self.fileFilter.isValidName(catalog.names[row]) for row in rows.tolist()]]
+        self.candidateIndices = rows
+        self.drawnCandidates = {}
+        if self.isQuota:
+            leaves = [catalog.folders[folderId] for folderId in catalog.parents[rows].tolist()]
+            logWeights = catalog.logWeights(self.candidateIndices) if self.isFolderBias else None
+            return QuotaSampler(leaves, self.quotaTopOf, logWeights)
+        if self.isFolderBias:
+            return CandidateSampler(len(self.candidateIndices), catalog.logWeights(self.candidateIndices))
+        return CandidateSampler(len(self.candidateIndices))
+
+    def targetNamesFor(self, folder, fileNum, source, sourceSize):
+        # Returns how the source's copy may be named as (name, numbered, start) for
+        # DestinationIndex.allocate, or None if the destination already has its content under any name
+        if self.indexFiles:
+            return f'{fileNum+1}.{source.name}', (f'{fileNum+1}.{source.stem} (', f'){source.suffix}'), 2
+        elif self.renameFiles:
+            return None, (f'{self.renameName} ', source.suffix), fileNum+1
+        else:
+            if folder.index.findDuplicate(str(source), sourceSize) is not None:
+                return None
+            return source.name, (f'{source.stem} (', f'){source.suffix}'), 2
+
+    def allocateTarget(self, folder, names, sourceAbsolute, size):
+        # The index holds the folder's listing and every copy of this run, so no stat is needed
+        return folder.path / folder.index.allocate(*names, size, sourceAbsolute)
+
+    def copyFile(self, folder, sourceAbsolute, target, names, size):
+        # Runs on the copy pool. Returns the OSError the copy failed with, None if it was copied,
+        # and the path it was copied to
+        while True:
+            try:
+                self.copier.copy(sourceAbsolute, target)
+                return None, target
+            except FileExistsError:
+                # Taken by another program after the folder was listed, the copy moves on to the next free name
+                folder.index.foreign(target.name)
+                target = self.allocateTarget(folder, (None,) + names[1:], sourceAbsolute, size)
+            except OSError as error:
+                return error, target
+    
+    ### LOG METHODS ###
+
+    def runRecord(self, folder):
+        now = datetime.datetime.now()
+        return {'date': now.strftime('%B %d, %Y'), 'time': now.strftime('%I:%M:%S%p'),
+                'root': str(self.root), 'dest': str(folder.path), 'requested': folder.numberOfFiles,
+                'extensions': self.extensions, 'keywords': self.keywords[:10], 'keywordCount': len(self.keywords)}
+
+    def writeStatusLog(self, folder):
+        # Ends the folder's run in its log and returns the status block for the log view
+        endFolderTime = perf_counter()
+        currentDate = datetime.datetime.now().strftime('%B %d, %Y')
+        currentTime = datetime.datetime.now().strftime('%I:%M:%S%p')
+        status = ''
+        timeOut = self.isTimedOut(self.startStallTime)
+
+        if folder.count == folder.numberOfFiles:
+            status = f'SUCCESS: {folder.count}/{folder.numberOfFiles} files copied'
+        elif timeOut and folder.count == 0 and self.isCreateFolders: 
+            status = f'NO FILES FOUND: timed out | folder deleted'
+        elif self.touched.isTouched(TouchedTree.ROOT) and folder.count == 0 and self.isCreateFolders: 
+            status = f'NO FILES FOUND: all files searched | folder deleted'
+        elif self.touched.isTouched(TouchedTree.ROOT): 
+            status = f'ALL FILES SEARCHED: {folder.count}/{folder.numberOfFiles} files copied'
+        elif timeOut: 
+            status = f'TIMED OUT: {folder.count}/{folder.numberOfFiles} files copied'
+        elif self.stopTracker:
+            status = f'STOPPED: {folder.count}/{folder.numberOfFiles} files copied'       
+        summary = {'status': status, 'date': currentDate, 'time': currentTime, 'copied': folder.count,
+                   'requested': folder.numberOfFiles, 'bytes': folder.bytes,
+                   'runtime': round(endFolderTime - folder.startTime, 2)}
+        folder.log.finish(summary)
+        return formatStatus(folder.log.run, summary)
+
+    def loadKeywordFile(self, path):
+        if not path:
+            return []
+        try:
+            return readKeywordFile(path)
+        except OSError:
+            self.signals.logSignal.emit(f'Keyword file could not be read: {path}')
+            return []
+
+    def isTimedOut(self, startStallTime):
+        endStallTime = perf_counter()
+        if endStallTime - startStallTime > self.stallLimit: 
+            return True
+        else: 
+            return False
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description='Copies random files from a root folder to a destination, without the window.',
+        epilog='Flags override the values of --config. Sizes and durations are given in --size-unit and --duration-unit.')
+    parser.add_argument('--config', help='.ini saved with Save in the window')
+    parser.add_argument('--root', help='folder to copy from')
+    parser.add_argument('--dest', help='folder to copy to')
+    count = parser.add_mutually_exclusive_group()
+    count.add_argument('--files', type=int, dest='numberOfFiles', help='number of files per folder')
+    count.add_argument('--files-range', type=int, nargs=2, metavar=('MIN', 'MAX'), dest='randomFiles',
+        help='random number of files per folder')
+    parser.add_argument('--keywords', nargs='+', help='names must contain one of these')
+    parser.add_argument('--exclude-keywords', nargs='+', dest='notKeywords', help='names must contain none of these')
+    parser.add_argument('--keyword-file', dest='keywordFile', help='file with one keyword per line')
+    parser.add_argument('--exclude-keyword-file', dest='notKeywordFile', help='file with one excluded keyword per line')
+    parser.add_argument('--extensions', nargs='+', help='extensions to copy, without the dot')
+    parser.add_argument('--exclude-extensions', nargs='+', dest='notExtensions', help='extensions to leave out')
+    parser.add_argument('--size', type=float, nargs=2, metavar=('MIN', 'MAX'), help='file size range')
+    parser.add_argument('--size-unit', choices=list(SIZE_UNITS), default='MB')
+    parser.add_argument('--duration', type=float, nargs=2, metavar=('MIN', 'MAX'), help='audio length range')
+    parser.add_argument('--duration-unit', choices=list(DURATION_UNITS), default='s')
+    parser.add_argument('--no-size', action='store_true', help='turn off a size range from --config')
+    parser.add_argument('--no-duration', action='store_true', help='turn off a length range from --config')
+    parser.add_argument('--top-weight', type=int, dest='topWeight', help='most files per folder under the root')
+    parser.add_argument('--bottom-weight', type=int, dest='bottomWeight', help='most files per folder that holds them')
+    parser.add_argument('--selection', choices=SELECTIONS)
+    parser.add_argument('--favor-size', action='store_const', const=True, dest='favorSize', help='stream selection only')
+    parser.add_argument('--favor-recent', action='store_const', const=True, dest='favorRecent', help='stream selection only')
+    parser.add_argument('--skip-duplicates', action='store_const', const=True, dest='skipDuplicates', help='skip files with the same content as one already picked')
+    parser.add_argument('--folders', type=int, dest='numberOfFolders', help='create this many folders in the destination')
+    parser.add_argument('--folder-name', dest='nameOfFolders')
+    parser.add_argument('--no-folders', action='store_true', help='copy straight into the destination')
+    parser.add_argument('--not-unique', action='store_const', const=False, dest='makeFoldersUnique',
+        help='let the same file go into several folders')
+    parser.add_argument('--parallel-folders', type=int, dest='parallelFolders',
+        help='fill this many unique folders at once')
+    parser.add_argument('--file-names', choices=FILE_NAMES, dest='fileNames')
+    parser.add_argument('--rename', dest='renameName', help='name for --file-names rename')
+    parser.add_argument('--trash-empty', action='store_const', const=True, dest='trashEmptyFolders')
+    parser.add_argument('--trash-valid', action='store_const', const=True, dest='trashSourceFiles')
+    parser.add_argument('--trash-invalid', action='store_const', const=True, dest='trashInvalidFiles')
+    parser.add_argument('--copies', type=int, dest='copyThreads', help='copies running at once')
+    parser.add_argument('--copy-mode', choices=COPY_MODES, dest='copyMode', help='hardlink or symlink instead of copying')
+    parser.add_argument('--stall', type=float, dest='stallLimit', help='seconds without a copy before a folder gives up')
+    parser.add_argument('--log-invalid', action='store_const', const=True, dest='showInvalid')
+    parser.add_argument('--quiet', action='store_true', help='only print folder statuses')
+    parser.add_argument('--show-log', metavar='LOG', help='print a run log (.jsonl) as text and exit')
+    return parser, parser.parse_args(argv)
+
+def optionsFromArguments(parser, args):
+    names = set(RunOptions.DEFAULTS) | {'root', 'dest'}
+    overrides = {name: value for name, value in vars(args).items() if name in names and value is not None}
+    if args.size is not None:
+        unit = SIZE_UNITS[args.size_unit]
+        overrides['sizeRange'] = (round(args.size[0] * unit, 2), round(args.size[1] * unit, 2))
+    if args.duration is not None:
+        unit = DURATION_UNITS[args.duration_unit]
+        overrides['durationRange'] = (args.duration[0] * unit, args.duration[1] * unit)
+    if args.no_size:
+        overrides['sizeRange'] = None
+    if args.no_duration:
+        overrides['durationRange'] = None
+    if args.numberOfFolders is not None:
+        overrides['createFolders'] = True
+    if args.no_folders:
+        overrides['createFolders'] = False
+    if 'numberOfFiles' in overrides:
+        overrides['randomFiles'] = None
+    try:
+        if args.config:
+            return RunOptions.fromSettingsFile(args.config, **overrides)
+        if args.root is None or args.dest is None:
+            parser.error('--root and --dest are needed without --config')
+        return RunOptions(overrides.pop('root'), overrides.pop('dest'), **overrides)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+def main(argv=None):
+    parser, args = parseArguments(argv)
+    if args.show_log:
+        print(renderRunLog(args.show_log))
+        return 0
+    options = optionsFromArguments(parser, args)
+    if not os.path.isdir(options.dest):
+        parser.error(f'Destination folder does not exist: {options.dest}')
+    signals = RunSignals()
+
+    def printLog(lines):
+        # Folder statuses start with a rule, everything else is one line per file
+        for text in lines:
+            if not args.quiet or text.startswith('---'):
+                print(text)
+        sys.stdout.flush()
+
+    signals.logSignal.connect(printLog)
+    mandala = Mandala(options, signals)
+
+    # The run goes on its own thread so Ctrl+C can stop it like the Stop button
+    thread = threading.Thread(target=mandala.run)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.2)
+    except KeyboardInterrupt:
+        mandala.stop()
+        thread.join()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
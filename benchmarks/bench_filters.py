@@ -0,0 +1,65 @@
+# Microbenchmark for the per-candidate filter cost
+# Compares the old isValidFile checks (a re.compile per keyword and extension for every
+# candidate) against FileFilter as the keyword and extension lists grow. The legacy checks
+# are skipped for the longest lists, they take minutes there.
+#   python benchmarks/bench_filters.py
+
+import os
+import re
+import sys
+import random
+import string
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from MandalaEngine import FileFilter
+
+def legacyIsValidName(source, keywords, notKeywords, extensions, notExtensions):
+    # The checks isValidFile used to run for every candidate
+    for notExtension in notExtensions:
+        if re.compile(rf'\.{notExtension}$', re.I).search(source.suffix) != None:
+            return False
+    for notKeyword in notKeywords:
+        if re.compile(rf'(.*){notKeyword}(.*)', re.I).search(source.stem) != None:
+            return False
+    isExtension = not extensions
+    for extension in extensions:
+        if re.compile(rf'\.{extension}$', re.I).search(source.suffix) != None:
+            isExtension = True
+            break
+    isKeyword = not keywords
+    for keyword in keywords:
+        if re.compile(rf'(.*){keyword}(.*)', re.I).search(source.stem) != None:
+            isKeyword = True
+            break
+    return isExtension and isKeyword
+
+def randomWord(length):
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+def makeNames(count):
+    suffixes = ['wav', 'mp3', 'flac', 'txt', 'png', 'aiff']
+    return [f'{randomWord(8)} {randomWord(6)} {randomWord(10)}.{random.choice(suffixes)}' for _ in range(count)]
+
+def main():
+    random.seed(1)
+    names = makeNames(2000)
+    paths = [Path(name) for name in names]
+    print(f'{"keywords":>9} {"extensions":>11} {"legacy us":>10} {"filter us":>10} {"speedup":>8}')
+    for listSize in (1, 5, 25, 100, 1000, 10000):
+        keywords = [randomWord(4) for _ in range(listSize)]
+        extensions = ['wav', 'mp3', 'flac'] + [randomWord(3) for _ in range(listSize)]
+        fileFilter = FileFilter(keywords, [], extensions, [])
+
+        compiled = timeit.timeit(lambda: [fileFilter.isValidName(n) for n in names], number=3)
+        compiledEach = compiled / (3 * len(names)) * 1e6
+        if listSize > 100:
+            print(f'{listSize:>9} {len(extensions):>11} {"-":>10} {compiledEach:>10.2f} {"-":>8}')
+            continue
+        legacy = timeit.timeit(lambda: [legacyIsValidName(p, keywords, [], extensions, []) for p in paths], number=3)
+        legacyEach = legacy / (3 * len(names)) * 1e6
+        print(f'{listSize:>9} {len(extensions):>11} {legacyEach:>10.2f} {compiledEach:>10.2f} {legacyEach / compiledEach:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Startup time against a budget
+# Measures, from process launch, the time until the window is first painted and the time
+# until the command line has copied its first file. Each is the median of several runs and
+# is compared with startup_budget.json, the script exits with 1 if a budget is exceeded.
+# The window is drawn offscreen and skipped if PySide2 isn't installed.
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --runs 9
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from time import perf_counter
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+# Runs in a child process: builds the window like the __main__ block and quits on its first paint
+PAINT_SCRIPT = '''
+import sys
+from PySide2.QtWidgets import QApplication
+from PySide2.QtCore import QObject, QEvent
+import CopyRandomFiles
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            print('painted', flush=True)
+            app.quit()
+        return False
+
+app = QApplication(sys.argv)
+watcher = PaintWatcher()
+app.installEventFilter(watcher)
+window = CopyRandomFiles.MainWindow()
+with open('CRFStyleSheet.qss', 'r') as f:
+    window.setStyleSheet(f.read())
+app.exec_()
+'''
+
+def timeUntil(command, pattern, cwd, env):
+    # Seconds from launching command until it prints a line matching pattern, None if it never does
+    start = perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    elapsed = None
+    for line in process.stdout:
+        if re.match(pattern, line):
+            elapsed = perf_counter() - start
+            break
+    process.stdout.close()
+    process.wait()
+    return elapsed
+
+def hasPySide2():
+    return subprocess.run([sys.executable, '-c', 'import PySide2'], stderr=subprocess.DEVNULL).returncode == 0
+
+def measureFirstPaint(runs):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    times = [timeUntil([sys.executable, '-c', PAINT_SCRIPT], r'painted', REPO, env) for _ in range(runs)]
+    return None if None in times else statistics.median(times)
+
+def measureFirstCopy(runs):
+    # A small tree and a fresh destination for every run. The index and metadata caches go to a
+    # cache folder of the benchmark's own, they stay warm between runs and are removed with it
+    work = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.join(work, 'cache'), LOCALAPPDATA=os.path.join(work, 'cache'))
+    try:
+        root = os.path.join(work, 'root')
+        for folder in range(10):
+            os.makedirs(os.path.join(root, f'folder {folder}'))
+            for file in range(20):
+                with open(os.path.join(root, f'folder {folder}', f'file {file}.txt'), 'w') as f:
+                    f.write('x' * file)
+        times = []
+        for run in range(runs):
+            dest = os.path.join(work, f'dest {run}')
+            os.mkdir(dest)
+            command = [sys.executable, os.path.join(REPO, 'MandalaEngine.py'), '--root', root, '--dest', dest, '--files', '1']
+            times.append(timeUntil(command, r'1: ', work, env))
+        return None if None in times else statistics.median(times)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, 'r', encoding='utf-8') as f:
+        budget = json.load(f)
+
+    results = {'cliFirstCopy': measureFirstCopy(args.runs)}
+    if hasPySide2():
+        results['guiFirstPaint'] = measureFirstPaint(args.runs)
+    else:
+        print('PySide2 is not installed, skipping the window')
+
+    isOverBudget = False
+    print(f'{"measure":>14} {"median s":>9} {"budget s":>9}')
+    for name, seconds in results.items():
+        if seconds is None:
+            print(f'{name:>14} {"failed":>9} {budget[name]:>9.3f}')
+            isOverBudget = True
+            continue
+        status = '' if seconds <= budget[name] else '  over budget'
+        isOverBudget = isOverBudget or bool(status)
+        print(f'{name:>14} {seconds:>9.3f} {budget[name]:>9.3f}{status}')
+    return 1 if isOverBudget else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# Header readers against soundfile on small generated files
+#   python -m pytest tests
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from MandalaEngine import readAudioHeader
+
+sf = pytest.importorskip('soundfile')
+np = pytest.importorskip('numpy')
+
+# (file name, soundfile format, subtype, samplerate, channels)
+FIXTURES = [
+    ('pcm16.wav', 'WAV', 'PCM_16', 44100, 2),
+    ('float.wav', 'WAV', 'FLOAT', 48000, 1),
+    ('ima.wav', 'WAV', 'IMA_ADPCM', 22050, 1),
+    ('ms.wav', 'WAV', 'MS_ADPCM', 22050, 2),
+    ('rf64.wav', 'RF64', 'PCM_24', 96000, 2),
+    ('pcm16.aiff', 'AIFF', 'PCM_16', 44100, 2),
+    ('pcm24.flac', 'FLAC', 'PCM_24', 88200, 1),
+    ('vorbis.ogg', 'OGG', 'VORBIS', 44100, 2),
+    ('opus.opus', 'OGG', 'OPUS', 48000, 1),
+    ('layer3.mp3', 'MP3', 'MPEG_LAYER_III', 44100, 2),
+]
+
+# Seconds of audio in every fixture, not a whole number of frames or pages
+DURATION = 1.2345
+
+def write(path, fileFormat, subtype, samplerate, channels):
+    frames = int(DURATION * samplerate)
+    data = 0.1 * np.sin(np.arange(frames) * 2 * np.pi * 440 / samplerate)
+    sf.write(path, np.repeat(data[:, None], channels, axis=1), samplerate, format=fileFormat, subtype=subtype)
+
+@pytest.mark.parametrize('name, fileFormat, subtype, samplerate, channels', FIXTURES)
+def testMatchesSoundfile(tmp_path, name, fileFormat, subtype, samplerate, channels):
+    path = str(tmp_path / name)
+    try:
+        write(path, fileFormat, subtype, samplerate, channels)
+    except (sf.LibsndfileError, TypeError, RuntimeError):
+        pytest.skip(f'libsndfile {sf.__libsndfile_version__} cannot write {fileFormat} {subtype}')
+    info = sf.info(path)
+    result = readAudioHeader(path)
+    assert result is not None, 'header reader fell back to a decoder'
+    duration, headerSamplerate = result
+    assert headerSamplerate == info.samplerate
+    # libsndfile pads MS ADPCM to whole blocks, the fact chunk has the length that was written
+    expected = int(DURATION * samplerate) / samplerate if subtype == 'MS_ADPCM' else info.duration
+    assert duration == pytest.approx(expected, abs=1e-3)
+
+def testNotAudio(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(b'not audio at all\n' * 100)
+    assert readAudioHeader(str(path)) == (None, None)
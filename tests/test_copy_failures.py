@@ -0,0 +1,52 @@
+# Copies that fail leave nothing behind and never count as invalid files
+#   python -m pytest tests
+
+import os
+import sys
+import errno
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import MandalaEngine
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    trashed = []
+    monkeypatch.setattr(MandalaEngine, 'trash', trashed.append)
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'song.txt').write_text('x' * 5000)
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    return root, dest, trashed
+
+def run(root, dest, **options):
+    lines = []
+    signals = MandalaEngine.RunSignals()
+    signals.logSignal.connect(lines.extend)
+    MandalaEngine.Mandala(MandalaEngine.RunOptions(str(root), str(dest), numberOfFiles=1,
+        trashInvalidFiles=True, **options), signals).run()
+    return lines
+
+def testFailedCopyRemovesPartialTarget(tree, monkeypatch):
+    root, dest, trashed = tree
+    def failHalfway(self, sourceFile, targetFile):
+        targetFile.write(sourceFile.read(100))
+        targetFile.flush()
+        raise OSError(errno.EIO, 'Input/output error')
+    monkeypatch.setattr(MandalaEngine.FileCopier, 'copyOpenFiles', failHalfway)
+    lines = run(root, dest)
+    assert [name for name in os.listdir(dest) if not name.startswith('!')] == []
+    assert '!!: song.txt (Input/output error)' in lines
+    assert trashed == []
+
+def testRefusedHardlinkIsNotTrashed(tree, monkeypatch):
+    root, dest, trashed = tree
+    def refuse(source, target):
+        raise PermissionError(errno.EPERM, 'Operation not permitted')
+    monkeypatch.setattr(MandalaEngine.os, 'link', refuse)
+    lines = run(root, dest, copyMode='hardlink')
+    assert '!!: song.txt (Operation not permitted)' in lines
+    assert trashed == []
+    assert (root / 'song.txt').exists()
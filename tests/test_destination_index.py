@@ -0,0 +1,119 @@
+# DestinationIndex: the duplicate ladder and names for the keep, index and rename modes
+#   python -m pytest tests
+
+import os
+import sys
+import types
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import MandalaEngine
+from MandalaEngine import DestinationIndex, PARTIAL_HASH_BYTES
+
+@pytest.fixture
+def hashed(monkeypatch):
+    # (path, limit) of every hash computed
+    calls = []
+    contentHash = MandalaEngine.contentHash
+    def countedHash(path, limit=None):
+        calls.append((os.path.basename(path), limit))
+        return contentHash(path, limit)
+    monkeypatch.setattr(MandalaEngine, 'contentHash', countedHash)
+    return calls
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+def testListsFilesOnly(tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / 'log.jsonl').write_text('log')
+    (tmp_path / 'sub').mkdir()
+    index = DestinationIndex(tmp_path, ignore=('log.jsonl',))
+    assert 'a.txt' in index
+    assert 'log.jsonl' not in index
+    assert 'sub' not in index
+
+def testDifferentSizesAreNeverHashed(tmp_path, hashed):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    write(dest / 'a.bin', b'a' * 10)
+    source = write(tmp_path / 'b.bin', b'a' * 11)
+    assert DestinationIndex(dest).findDuplicate(source, 11) is None
+    assert hashed == []
+
+def testDifferentStartStopsAtPartialHash(tmp_path, hashed):
+    size = PARTIAL_HASH_BYTES * 2
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    write(dest / 'a.bin', b'a' * size)
+    source = write(tmp_path / 'b.bin', b'b' * size)
+    assert DestinationIndex(dest).findDuplicate(source, size) is None
+    assert all(limit == PARTIAL_HASH_BYTES for name, limit in hashed)
+
+def testSameStartIsSettledByFullHash(tmp_path, hashed):
+    size = PARTIAL_HASH_BYTES * 2
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    write(dest / 'a.bin', b'a' * size)
+    different = write(tmp_path / 'b.bin', b'a' * (size - 1) + b'b')
+    same = write(tmp_path / 'c.bin', b'a' * size)
+    index = DestinationIndex(dest)
+    assert index.findDuplicate(different, size) is None
+    assert ('b.bin', None) in hashed
+    assert index.findDuplicate(same, size) == 'a.bin'
+
+def testSmallFilesReuseThePartialHash(tmp_path, hashed):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    write(dest / 'a.bin', b'abc')
+    source = write(tmp_path / 'b.bin', b'abc')
+    assert DestinationIndex(dest).findDuplicate(source, 3) == 'a.bin'
+    assert all(limit == PARTIAL_HASH_BYTES for name, limit in hashed)
+
+def testCopiesInFlightAreHashedFromTheirSource(tmp_path):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    source = write(tmp_path / 'a.bin', b'abc')
+    index = DestinationIndex(dest)
+    name = index.allocate('a.bin', ('a (', ').bin'), 2, 3, source)
+    # Not copied yet, the entry still finds the content through its source
+    assert index.findDuplicate(write(tmp_path / 'b.bin', b'abc'), 3) == name
+    write(dest / name, b'abc')
+    index.landed(name)
+    os.remove(source)
+    assert index.findDuplicate(str(tmp_path / 'b.bin'), 3) == name
+    index.remove(name)
+    assert name not in index
+    assert index.findDuplicate(str(tmp_path / 'b.bin'), 3) is None
+
+def namesFor(mode, fileNum, source):
+    # The (name, numbered, start) a run of the given file name mode asks allocate for
+    self = types.SimpleNamespace(indexFiles=mode == 'index', renameFiles=mode == 'rename', renameName='Mix')
+    folder = types.SimpleNamespace(index=types.SimpleNamespace(findDuplicate=lambda source, size: None))
+    return MandalaEngine.Mandala.targetNamesFor(self, folder, fileNum, MandalaEngine.Path(source), 0)
+
+@pytest.mark.parametrize('mode, taken, expected', [
+    ('keep', [], ['song.mp3', 'song (2).mp3', 'song (3).mp3']),
+    ('keep', ['song.mp3', 'song (3).mp3'], ['song (2).mp3', 'song (4).mp3', 'song (5).mp3']),
+    ('index', [], ['1.song.mp3', '1.song (2).mp3', '1.song (3).mp3']),
+    ('index', ['1.song.mp3'], ['1.song (2).mp3', '1.song (3).mp3', '1.song (4).mp3']),
+    ('rename', [], ['Mix 1.mp3', 'Mix 2.mp3', 'Mix 3.mp3']),
+    ('rename', ['Mix 2.mp3'], ['Mix 1.mp3', 'Mix 3.mp3', 'Mix 4.mp3']),
+])
+def testAllocate(tmp_path, mode, taken, expected):
+    # The same file three times as file 1, then numbered ones for files 2 and 3 when renaming
+    for name in taken:
+        (tmp_path / name).write_text(name)
+    index = DestinationIndex(tmp_path)
+    names = [index.allocate(*namesFor(mode, 0 if mode != 'rename' else i, '/src/song.mp3'), 0, '/src/song.mp3')
+        for i in range(3)]
+    assert names == expected
+
+def testForeignNameStaysTaken(tmp_path):
+    index = DestinationIndex(tmp_path)
+    name = index.allocate('a.txt', ('a (', ').txt'), 2, 1, '/src/a.txt')
+    (tmp_path / name).write_text('other')
+    index.foreign(name)
+    assert name in index
+    assert index.allocate('a.txt', ('a (', ').txt'), 2, 1, '/src/a.txt') == 'a (2).txt'
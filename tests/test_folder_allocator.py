@@ -0,0 +1,46 @@
+# FolderAllocator: which existing folders count as taken and what it creates next
+#   python -m pytest tests
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from MandalaEngine import FolderAllocator
+
+def allocate(parent, name, existing, count):
+    for folder in existing:
+        (parent / folder).mkdir()
+    allocator = FolderAllocator(parent, name)
+    return [allocator.make().name for _ in range(count)]
+
+@pytest.mark.parametrize('existing, expected', [
+    ([], ['Mix', 'Mix 2', 'Mix 3']),
+    (['Mix'], ['Mix 2', 'Mix 3', 'Mix 4']),
+    # Gaps are filled first
+    (['Mix', 'Mix 3'], ['Mix 2', 'Mix 4', 'Mix 5']),
+    (['Mix 2'], ['Mix', 'Mix 3', 'Mix 4']),
+    # "Mix 1", "Mix 01" and "Mix 0" are other names, not numbers of "Mix"
+    (['Mix 1'], ['Mix', 'Mix 2', 'Mix 3']),
+    (['Mix 01', 'Mix 02'], ['Mix', 'Mix 2', 'Mix 3']),
+    (['Mix 0'], ['Mix', 'Mix 2', 'Mix 3']),
+    # Only exact names count
+    (['Mixes', 'mix 2', 'Mix 2 old', 'Mix  3'], ['Mix', 'Mix 2', 'Mix 3']),
+    (['Mix 10'], ['Mix', 'Mix 2', 'Mix 3']),
+])
+def testNumbers(tmp_path, existing, expected):
+    assert allocate(tmp_path, 'Mix', existing, 3) == expected
+
+def testFilesTakeNamesToo(tmp_path):
+    (tmp_path / 'Mix').write_text('a file')
+    assert allocate(tmp_path, 'Mix', [], 1) == ['Mix 2']
+
+def testNameWithPatternCharacters(tmp_path):
+    assert allocate(tmp_path, 'Mix (A+B)', ['Mix (A+B)', 'Mix (A+B) 2', 'Mix (AAB) 3'], 2) == ['Mix (A+B) 3', 'Mix (A+B) 4']
+
+def testNameTakenAfterListing(tmp_path):
+    # Another program made "Mix 2" after the parent was listed, it's skipped
+    allocator = FolderAllocator(tmp_path, 'Mix')
+    assert allocator.make().name == 'Mix'
+    (tmp_path / 'Mix 2').mkdir()
+    assert allocator.make().name == 'Mix 3'
@@ -0,0 +1,44 @@
+# Folders filled at once end up like folders filled one at a time
+#   python -m pytest tests
+
+import os
+import sys
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import MandalaEngine
+
+SELECTIONS = ['walk', 'uniform', 'bias', 'stream']
+
+def makeTree(root, folders, files):
+    for folder in range(folders):
+        (root / f'folder {folder}').mkdir(parents=True)
+        for file in range(files):
+            (root / f'folder {folder}' / f'{file}.txt').write_text(f'{folder} {file}')
+
+def run(root, dest, **options):
+    dest.mkdir()
+    MandalaEngine.Mandala(MandalaEngine.RunOptions(str(root), str(dest), createFolders=True, **options)).run()
+    return [len([name for name in os.listdir(dest / folder) if not name.startswith('!')]) for folder in sorted(os.listdir(dest))]
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    random.seed(1)
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def testScarceSourceFillsFoldersInOrder(tmp_path, selection):
+    # 23 files for 4 folders of 10, the first two are complete like in a sequential run
+    makeTree(tmp_path / 'root', 1, 23)
+    counts = run(tmp_path / 'root', tmp_path / 'dest', numberOfFiles=10, numberOfFolders=4, parallelFolders=3, selection=selection)
+    assert counts == [10, 10, 3]
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def testSkippedFilesGoToFoldersOpenedLater(tmp_path, selection):
+    # With a bottom weight of 1 every folder takes one file per source folder. Files skipped
+    # while the first folders were open must still reach the folders opened after them
+    makeTree(tmp_path / 'root', 3, 4)
+    counts = run(tmp_path / 'root', tmp_path / 'dest', numberOfFiles=3, numberOfFolders=4, parallelFolders=3,
+        bottomWeight=1, selection=selection)
+    assert counts == [3, 3, 3, 3]
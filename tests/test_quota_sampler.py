@@ -0,0 +1,126 @@
+# QuotaSampler blocking and draw counts of weighted runs
+#   python -m pytest tests
+
+import os
+import sys
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import MandalaEngine
+from MandalaEngine import FenwickTree, QuotaSampler
+
+# Candidates 0-2 in /r/a, 3-7 in /r/a/x, 8-9 in /r/b and 10-11 in the root
+LEAVES = ['/r/a'] * 3 + ['/r/a/x'] * 5 + ['/r/b'] * 2 + ['/r'] * 2
+TOPS = {'/r/a': '/r/a', '/r/a/x': '/r/a', '/r/b': '/r/b', '/r': ''}
+
+def makeSampler(isBias):
+    return QuotaSampler(LEAVES, TOPS.get, [random.uniform(-3, 0) for _ in LEAVES] if isBias else None)
+
+def drawAll(sampler):
+    drawn = []
+    while (i := sampler.draw()) is not None:
+        drawn.append(i)
+    return drawn
+
+def testFenwickTree():
+    random.seed(1)
+    weights = [random.randrange(5) for _ in range(37)]
+    tree = FenwickTree(weights)
+    for _ in range(200):
+        i = random.randrange(len(weights))
+        weights[i] = random.randrange(5)
+        tree.set(i, weights[i])
+        assert tree.total == sum(weights)
+        offset = random.randrange(tree.total)
+        # The item whose running total first passes offset
+        assert tree.find(offset) == next(i for i in range(len(weights)) if sum(weights[:i + 1]) > offset)
+
+@pytest.mark.parametrize('isBias', [False, True])
+def testDrawsEveryCandidateOnce(isBias):
+    random.seed(2)
+    sampler = makeSampler(isBias)
+    assert len(sampler) == len(LEAVES)
+    assert sorted(drawAll(sampler)) == list(range(len(LEAVES)))
+    assert len(sampler) == 0
+    sampler.reset()
+    assert sorted(drawAll(sampler)) == list(range(len(LEAVES)))
+
+@pytest.mark.parametrize('isBias', [False, True])
+def testBlockedFoldersAreNeverDrawn(isBias):
+    random.seed(3)
+    sampler = makeSampler(isBias)
+    # A blocked top folder takes the folders under it along
+    sampler.setBlocked('/r/a', True, True)
+    sampler.setBlocked('/r/b', False, True)
+    assert sorted(drawAll(sampler)) == [10, 11]
+    assert len(sampler) == 10
+
+    # Candidates put back into a blocked folder wait for it
+    sampler.putBack([10])
+    sampler.setBlocked('/r/b', False, False)
+    assert sorted(drawAll(sampler)) == [8, 9, 10]
+
+    # Unblocking the top folder while its leaf stays blocked only opens the others
+    sampler.setBlocked('/r/a/x', False, True)
+    sampler.setBlocked('/r/a', True, False)
+    assert sorted(drawAll(sampler)) == [0, 1, 2]
+    sampler.unblockAll()
+    assert sorted(drawAll(sampler)) == [3, 4, 5, 6, 7]
+    assert len(sampler) == 0
+
+@pytest.mark.parametrize('isBias', [False, True])
+def testBlockingMidRun(isBias):
+    # Blocking and unblocking between draws leaves stale heads behind, they must never be drawn
+    random.seed(4)
+    sampler = makeSampler(isBias)
+    drawn = []
+    for step in range(len(LEAVES) * 3):
+        isBlocked = step % 3 == 0
+        sampler.setBlocked('/r/a/x', False, isBlocked)
+        i = sampler.draw()
+        if i is None:
+            continue
+        assert not (isBlocked and LEAVES[i] == '/r/a/x')
+        drawn.append(i)
+    sampler.unblockAll()
+    drawn += drawAll(sampler)
+    assert sorted(drawn) == list(range(len(LEAVES)))
+
+@pytest.mark.parametrize('selection', ['uniform', 'bias'])
+@pytest.mark.parametrize('weight', [{'bottomWeight': 1}, {'topWeight': 2}])
+def testWeightedRunDrawsOncePerFile(tmp_path, monkeypatch, selection, weight):
+    # 8 top folders with 5 folders of 4 files each. A run of 16 files with a bottom weight of 1
+    # or a top weight of 2 draws exactly 16 candidates, none of them from a saturated folder
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'root'
+    for top in range(8):
+        for leaf in range(5):
+            folder = root / f'top {top}' / f'leaf {leaf}'
+            folder.mkdir(parents=True)
+            for file in range(4):
+                (folder / f'{file}.txt').write_text(f'{top} {leaf} {file}')
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+
+    draws = []
+    draw = QuotaSampler.draw
+    def countedDraw(self):
+        i = draw(self)
+        draws.append(i)
+        return i
+    monkeypatch.setattr(QuotaSampler, 'draw', countedDraw)
+
+    random.seed(5)
+    options = MandalaEngine.RunOptions(str(root), str(dest), numberOfFiles=16, numberOfFolders=1,
+        selection=selection, copyMode='symlink', **weight)
+    MandalaEngine.Mandala(options, MandalaEngine.RunSignals()).run()
+
+    copies = [path for path in dest.iterdir() if not path.name.startswith('!')]
+    assert len(copies) == 16
+    assert len(draws) == 16
+    folders = [os.path.relpath(os.readlink(path), root).split(os.sep) for path in copies]
+    if 'bottomWeight' in weight:
+        assert len({tuple(folder[:2]) for folder in folders}) == 16
+    else:
+        assert all(sum(folder[0] == top for folder in folders) == 2 for top in {folder[0] for folder in folders})
@@ -0,0 +1,116 @@
+# RunLog records, the footer index and the log as text, also through --show-log
+#   python -m pytest tests
+
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO)
+import MandalaEngine
+from MandalaEngine import RunLog, readFooter, readLastRun, readRecord, renderRunLog
+
+RUN = {'date': 'May 1, 2024', 'time': '10:00:00AM', 'root': '/music', 'dest': '/picks', 'requested': 2,
+       'extensions': ['mp3'], 'keywords': [], 'keywordCount': 0}
+
+def summary(status, copied):
+    return {'status': status, 'date': 'May 1, 2024', 'time': '10:01:00AM', 'copied': copied,
+            'requested': 2, 'bytes': 3000, 'runtime': 1.5}
+
+def writeRun(path, sources, status='SUCCESS: 2/2 files copied', isFinished=True):
+    log = RunLog(path)
+    log.start(RUN)
+    for number, source in enumerate(sources, 1):
+        log.addFile(number, source, 1500)
+    if isFinished:
+        log.finish(summary(status, len(sources)))
+    else:
+        log.close()
+    return log
+
+def records(path):
+    with open(path, 'rb') as f:
+        return [json.loads(line) for line in f]
+
+def testSingleRun(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    log = writeRun(path, ['a/1.mp3', 'b/2.mp3'])
+    assert not log.isAppend
+    assert [record['record'] for record in records(path)] == ['run', 'file', 'file', 'summary', 'index']
+    offset, index = readFooter(path)
+    with open(path, 'rb') as f:
+        assert readRecord(f, offset) == index
+    assert index['previous'] is None
+    run, last = readLastRun(path)
+    assert run == dict({'record': 'run'}, **RUN)
+    assert last['status'] == 'SUCCESS: 2/2 files copied'
+
+def testAppendedRunsAreChained(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    writeRun(path, ['a/1.mp3', 'b/2.mp3'])
+    firstOffset, firstIndex = readFooter(path)
+    log = writeRun(path, ['c/3.mp3'], 'ALL FILES SEARCHED: 1/2 files copied')
+    assert log.isAppend
+    offset, index = readFooter(path)
+    assert index['previous'] == firstOffset
+    with open(path, 'rb') as f:
+        assert readRecord(f, index['previous']) == firstIndex
+        assert readRecord(f, firstIndex['summary'])['status'] == 'SUCCESS: 2/2 files copied'
+    assert readLastRun(path)[1]['status'] == 'ALL FILES SEARCHED: 1/2 files copied'
+
+def testFooterAfterLongLines(tmp_path):
+    # The footer is found when the lines before it are longer than a read block
+    path = tmp_path / 'log.jsonl'
+    writeRun(path, ['x' * 5000 + '.mp3', 'y' * 9000 + '.mp3'])
+    offset, index = readFooter(path)
+    with open(path, 'rb') as f:
+        assert readRecord(f, index['run'])['record'] == 'run'
+
+def testUnfinishedRun(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    writeRun(path, ['a/1.mp3'], isFinished=False)
+    assert readFooter(path) is None
+    assert readLastRun(path) is None
+    # A line cut off by a crash doesn't count as a footer either
+    writeRun(path, ['b/2.mp3'])
+    with open(path, 'ab') as f:
+        f.write(b'{"record": "fi')
+    assert readFooter(path) is None
+
+def testRender(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    writeRun(path, ['a/1.mp3', 'b/2.mp3'])
+    writeRun(path, ['c/3.mp3'], isFinished=False)
+    writeRun(path, ['d/4.mp3'], 'ALL FILES SEARCHED: 1/2 files copied')
+    text = renderRunLog(path)
+    statuses = [line for line in text.split('\n') if ': ' in line and line.split(':')[0].isupper()]
+    assert statuses == ['SUCCESS: 2/2 files copied', 'INTERRUPTED: 1/2 files copied', 'ALL FILES SEARCHED: 1/2 files copied']
+    assert [line for line in text.split('\n') if line[:1].isdigit()] == ['1: a/1.mp3', '2: b/2.mp3', '1: c/3.mp3', '1: d/4.mp3']
+    assert text.count('Start:\t/music') == 3
+
+def testShowLog(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    writeRun(path, ['a/1.mp3', 'b/2.mp3'])
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'MandalaEngine.py'), '--show-log', str(path)],
+        capture_output=True, text=True, encoding='utf-8')
+    assert result.returncode == 0
+    assert result.stdout == renderRunLog(path) + '\n'
+
+def testRunsIntoOneFolderAppend(tmp_path, monkeypatch):
+    # Two runs into the same destination share its log, the second one chained to the first
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    root = tmp_path / 'root'
+    root.mkdir()
+    for file in range(3):
+        (root / f'{file}.txt').write_text(str(file))
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    for _ in range(2):
+        MandalaEngine.Mandala(MandalaEngine.RunOptions(str(root), str(dest), numberOfFiles=1)).run()
+    path = dest / '!dest_log.jsonl'
+    assert [record['record'] for record in records(path)].count('index') == 2
+    offset, index = readFooter(path)
+    assert index['previous'] is not None
+    assert renderRunLog(path).count('SUCCESS: 1/1 files copied') == 2
@@ -0,0 +1,61 @@
+# The window against settings saved by nothing at all, like on a fresh profile
+#   python -m pytest tests
+
+import os
+import sys
+import pytest
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO)
+pytest.importorskip('PySide2.QtWidgets')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PySide2.QtWidgets import QApplication
+from PySide2.QtCore import QSettings
+
+@pytest.fixture(scope='module')
+def window(tmp_path_factory):
+    # The window's own QSettings and cache go to empty temporary folders
+    folder = tmp_path_factory.mktemp('profile')
+    cache = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = str(folder / 'cache')
+    QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, str(folder / 'settings'))
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, str(folder / 'settings'))
+    app = QApplication.instance() or QApplication([])
+    import CopyRandomFiles
+    window = CopyRandomFiles.MainWindow()
+    yield window
+    window.close()
+    if cache is None:
+        del os.environ['XDG_CACHE_HOME']
+    else:
+        os.environ['XDG_CACHE_HOME'] = cache
+
+@pytest.mark.parametrize('combo, items, default', [
+    ('copyModeCombo', ['copy', 'hardlink', 'symlink'], 'copy'),
+    ('sizeType', ['B', 'KB', 'MB', 'GB'], 'MB'),
+    ('durationType', ['s', 'm'], 's'),
+])
+def testFixedCombosFromEmptySettings(window, tmp_path, combo, items, default):
+    window.guiRestore(QSettings(str(tmp_path / 'empty.ini'), QSettings.IniFormat))
+    obj = getattr(window, combo)
+    assert [obj.itemText(i) for i in range(obj.count())] == items
+    assert obj.currentText() == default
+
+def testUnknownSavedUnitFallsBack(window, tmp_path):
+    settings = QSettings(str(tmp_path / 'old.ini'), QSettings.IniFormat)
+    settings.setValue('currentsizeType', 'TB')
+    settings.setValue('currentcopyModeCombo', '')
+    window.guiRestore(settings)
+    assert window.sizeType.currentText() == 'MB'
+    assert window.copyModeCombo.currentText() == 'copy'
+
+def testRunOptionsFromEmptySettings(window, tmp_path):
+    window.guiRestore(QSettings(str(tmp_path / 'empty.ini'), QSettings.IniFormat))
+    window.sizeLo.setValue(1)
+    window.sizeHi.setValue(2)
+    assert window.convertToBytes() == (1048576, 2097152)
+    window.durationLo.setValue(3)
+    window.durationHi.setValue(4)
+    assert window.convertToSeconds() == (3, 4)
+    options = window.runOptions()
+    assert options.copyMode == 'copy'